@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Measure the throughput of the decoder for messages read from the device.
+
+The indexed decoder from :mod:`mv7config.protocol` is compared against the
+previous approach of scanning every property for each message.
+"""
+import sys
+import os
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from mv7config.protocol import microphone_properties, decode_message
+
+
+# Typical mix of answers received after the initial fetch
+messages = [
+    "pkgVersion=1.2.1.0\n",
+    "fwVersion=1.2.1\n",
+    "dspVersion=1.0.7\n",
+    "serialNum=1234567890ABCDEF\n",
+    "lock=off\n",
+    "audioMute=off\n",
+    "volume=-12.00dB\n",
+    "dspMode=1\n",
+    "micMute=off\n",
+    "inputGain=18.50dB\n",
+    "block 22 002026F3004026E7\n",
+    "block 19 00000002\n",
+    "block 1F 00000001\n",
+    "block 31 00000003\n",
+    "block 34 00000005\n",
+    "block 22 Not valid\n",
+    "su=adm\n",
+]
+
+
+def linear_decode(message):
+    """Decode a message by scanning all properties, as done previously."""
+    if "=" in message:
+        key, value = message.strip().split("=", maxsplit=1)
+        block = False
+    elif message.startswith("block ") and "Not valid" not in message:
+        key, value = message[6:].strip().split(" ", maxsplit=1)
+        block = True
+    else:
+        return None
+
+    values = []
+
+    for local_name, prop in microphone_properties.items():
+        if key == prop.receive_command:
+            values.append((
+                local_name,
+                prop.parse_remote(int(value, 16) if block else value),
+            ))
+
+    return (key, values) if values else None
+
+
+def measure(decode, rounds=2000, repeat=5):
+    """Return the best decoding rate over a few runs, in messages/sec."""
+    best = min(timeit.repeat(
+        lambda: [decode(message) for message in messages],
+        number=rounds,
+        repeat=repeat,
+    ))
+    return rounds * len(messages) / best
+
+
+def main():
+    for message in messages:
+        assert linear_decode(message) == decode_message(message), message
+
+    before = measure(linear_decode)
+    after = measure(decode_message)
+
+    print(f"linear scan: {before:12,.0f} messages/sec")
+    print(f"indexed:     {after:12,.0f} messages/sec")
+    print(f"speedup:     {after / before:12.2f}x")
+
+
+if __name__ == "__main__":
+    main()
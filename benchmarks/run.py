@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+"""
+Measure the hot paths of the library against a simulated microphone.
+
+Results are printed as JSON and can be compared against a stored baseline
+to detect regressions:
+
+    benchmarks/run.py --output baseline.json
+    benchmarks/run.py --compare baseline.json
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from mv7config.protocol import decode_message
+from mv7config.simulator import SimulatedDevice, default_values
+from mv7config.text_hid import TextHID
+from parse_message import messages
+
+
+# Maximum number of seconds to wait for the microphone in each benchmark
+wait_timeout = 10
+
+
+class NullDevice(TextHID):
+    """Device that discards reports and always reads the same one."""
+    def __init__(self, report):
+        self._incoming = report.ljust(64, b"\0")
+        super().__init__(b"null")
+
+    def _open(self):
+        pass
+
+    def _write_raw(self, report):
+        pass
+
+    def _read_raw(self, timeout_ms):
+        return self._incoming
+
+
+class TimedDevice(SimulatedDevice):
+    """Simulated device recording the wall time at which commands arrive."""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.arrivals = []
+
+    def _handle(self, command):
+        self.arrivals.append((time.perf_counter(), command))
+        super()._handle(command)
+
+
+def run_main_loop(done):
+    """Run the GLib main loop until a predicate holds."""
+    from gi.repository import GLib
+
+    context = GLib.MainContext.default()
+    deadline = time.monotonic() + wait_timeout
+
+    while not done():
+        if time.monotonic() > deadline:
+            raise TimeoutError("Microphone did not respond in time")
+
+        context.iteration(True)
+
+
+def start_microphone(device, use_cache=False):
+    """Open and initialize a microphone, returning it with timings."""
+    from mv7config.microphone import Microphone
+
+    # Times at which the initialized signal was emitted, read when it is
+    # emitted since the device keeps being queried afterwards
+    initialized = []
+    microphone = Microphone(
+        device=device,
+        use_cache=use_cache,
+        serial_number=default_values["serialNum"],
+    )
+    microphone.connect(
+        "initialized",
+        lambda _: initialized.append((time.perf_counter(), device.clock())),
+    )
+
+    wall_start = time.perf_counter()
+    virtual_start = device.clock()
+    microphone.initialize()
+    run_main_loop(lambda: initialized)
+    wall_end, virtual_end = initialized[0]
+
+    return microphone, wall_end - wall_start, virtual_end - virtual_start
+
+
+def bench_cold_start():
+    """Time from initialize() to the initialized signal."""
+    microphone, wall, virtual = start_microphone(SimulatedDevice())
+    microphone.close()
+
+    return {
+        "cold_start_wall": (wall, "s", "lower"),
+        "cold_start_virtual": (virtual, "s", "lower"),
+    }
+
+
+def bench_warm_start():
+    """Time from initialize() to the initialized signal with a saved state."""
+    saved_cache_home = os.environ.get("XDG_CACHE_HOME")
+
+    with tempfile.TemporaryDirectory() as cache_home:
+        os.environ["XDG_CACHE_HOME"] = cache_home
+
+        try:
+            microphone, _, _ = start_microphone(
+                SimulatedDevice(),
+                use_cache=True,
+            )
+            microphone.close()
+
+            microphone, wall, virtual = start_microphone(
+                SimulatedDevice(),
+                use_cache=True,
+            )
+            microphone.close()
+        finally:
+            if saved_cache_home is None:
+                del os.environ["XDG_CACHE_HOME"]
+            else:
+                os.environ["XDG_CACHE_HOME"] = saved_cache_home
+
+    return {
+        "warm_start_wall": (wall, "s", "lower"),
+        "warm_start_virtual": (virtual, "s", "lower"),
+    }
+
+
+def bench_mode_switch():
+    """Time from a DSP mode change until the reset properties are fetched."""
+    from mv7config.microphone import Mode
+
+    device = SimulatedDevice()
+    microphone, _, _ = start_microphone(device)
+
+    wall_start = time.perf_counter()
+    virtual_start = device.clock()
+    microphone.props.mode = Mode.Auto
+    run_main_loop(lambda: microphone.props.mode == Mode.Auto)
+    wall = time.perf_counter() - wall_start
+    virtual = device.clock() - virtual_start
+    microphone.close()
+
+    return {
+        "mode_switch_wall": (wall, "s", "lower"),
+        "mode_switch_virtual": (virtual, "s", "lower"),
+    }
+
+
+def bench_setter_to_wire(samples=20):
+    """Time from setting a property until its command reaches the device."""
+    from mv7config.microphone import max_write_rate
+
+    device = TimedDevice()
+    microphone, _, _ = start_microphone(device)
+    latencies = []
+
+    for sample in range(samples):
+        count = len(device.arrivals)
+        start = time.perf_counter()
+        microphone.props.monitor_volume = -100 * (sample % 2 + 1)
+
+        while len(device.arrivals) == count:
+            time.sleep(0)
+
+        latencies.append(device.arrivals[count][0] - start)
+
+        # Stay below the write rate to measure isolated writes
+        time.sleep(1 / max_write_rate)
+
+    microphone.close()
+    return {
+        "setter_to_wire_median": (statistics.median(latencies), "s", "lower"),
+    }
+
+
+def bench_parse_message(rounds=2000):
+    """Throughput of applying messages from the device to a microphone."""
+    from gi.repository import GLib
+
+    # The connection is closed first so that the I/O thread does not parse
+    # messages of its own during the measurement
+    microphone, _, _ = start_microphone(SimulatedDevice())
+    microphone.close()
+
+    def parse():
+        for message in messages:
+            microphone._parse_message(message)
+
+    try:
+        best = min(timeit.repeat(parse, number=rounds, repeat=5))
+    finally:
+        # Deliver the notifications scheduled while parsing
+        context = GLib.MainContext.default()
+
+        while context.pending():
+            context.iteration(False)
+
+    decode_best = min(timeit.repeat(
+        lambda: [decode_message(message) for message in messages],
+        number=rounds,
+        repeat=5,
+    ))
+
+    return {
+        "parse_message_rate": (rounds * len(messages) / best, "msg/s", "higher"),
+        "decode_message_rate": (
+            rounds * len(messages) / decode_best, "msg/s", "higher",
+        ),
+    }
+
+
+def bench_text_hid(rounds=20000):
+    """Cost of encoding and decoding one report."""
+    device = NullDevice(b"block 22 002026F3004026E7\n")
+    encode = min(timeit.repeat(
+        lambda: device.send_command("setBlock 22 002026F3004026E7"),
+        number=rounds,
+        repeat=5,
+    ))
+    decode = min(timeit.repeat(
+        lambda: device.read_message(),
+        number=rounds,
+        repeat=5,
+    ))
+
+    return {
+        "text_hid_encode": (encode / rounds, "s", "lower"),
+        "text_hid_decode": (decode / rounds, "s", "lower"),
+    }
+
+
+def bench_gui_startup(samples=5):
+    """Time from process start until the first frame of the window."""
+    if not (os.environ.get("DISPLAY") or os.environ.get("WAYLAND_DISPLAY")):
+        print("gui_startup: skipped, no display available", file=sys.stderr)
+        return {}
+
+    gui = os.path.join(os.path.dirname(__file__), os.pardir, "gui.py")
+    env = dict(os.environ, MV7CONFIG_EXIT_AFTER_FIRST_FRAME="1")
+    durations = []
+
+    for sample in range(samples):
+        result = subprocess.run(
+            [sys.executable, gui],
+            env=env,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            timeout=wait_timeout,
+            check=True,
+        )
+        lines = result.stdout.splitlines()
+
+        if not lines:
+            print(
+                "gui_startup: skipped, process start time unavailable",
+                file=sys.stderr,
+            )
+            return {}
+
+        durations.append(float(lines[-1]))
+
+    return {
+        "gui_startup_median": (statistics.median(durations), "s", "lower"),
+    }
+
+
+benchmarks = {
+    "cold_start": bench_cold_start,
+    "warm_start": bench_warm_start,
+    "mode_switch": bench_mode_switch,
+    "setter_to_wire": bench_setter_to_wire,
+    "parse_message": bench_parse_message,
+    "text_hid": bench_text_hid,
+    "gui_startup": bench_gui_startup,
+}
+
+
+def run(names):
+    """Run a set of benchmarks and gather their results."""
+    results = {}
+
+    for name in names:
+        for metric, (value, unit, better) in benchmarks[name]().items():
+            results[metric] = {"value": value, "unit": unit, "better": better}
+
+    return {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": results,
+    }
+
+
+def compare(current, baseline, tolerance):
+    """
+    Print the relative change of each metric against a baseline.
+
+    :returns: list of metrics that regressed by more than the tolerance
+    """
+    regressions = []
+
+    for metric, result in current["results"].items():
+        if metric not in baseline["results"]:
+            continue
+
+        before = baseline["results"][metric]["value"]
+
+        if before:
+            change = (result["value"] - before) / abs(before)
+        elif result["value"]:
+            change = math.copysign(math.inf, result["value"])
+        else:
+            change = 0.0
+
+        slowdown = -change if result["better"] == "higher" else change
+        regressed = slowdown > tolerance
+
+        if regressed:
+            regressions.append(metric)
+
+        print(
+            f"{metric:24} {before:12.6g} -> {result['value']:12.6g}"
+            f" {result['unit']:6} {change:+8.1%}"
+            + (" REGRESSION" if regressed else ""),
+            file=sys.stderr,
+        )
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "names", nargs="*", metavar="name",
+        help="benchmarks to run among: " + ", ".join(benchmarks)
+        + " (default: all)",
+    )
+    parser.add_argument("--output", help="file to write the results to")
+    parser.add_argument("--compare", help="baseline results to compare to")
+    parser.add_argument(
+        "--tolerance", type=float, default=.1,
+        help="relative slowdown reported as a regression (default: 0.1)",
+    )
+    args = parser.parse_args()
+
+    for name in args.names:
+        if name not in benchmarks:
+            parser.error(f"unknown benchmark: {name}")
+
+    current = run(args.names or list(benchmarks))
+    output = json.dumps(current, indent=2)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output + "\n")
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+
+        if compare(current, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
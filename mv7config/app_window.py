@@ -1,15 +1,13 @@
-import os
 import gi
 from gi.repository import Gtk
 from gi.repository.GObject import BindingFlags
-from .microphone import Microphone
-from .microphone_control_page import MicrophoneControlPage
+from .microphone_manager import MicrophoneManager
+from .hotplug import DeviceMonitor
+from .utils import BindingGroup
+from . import resources
 
 
-dirname = os.path.dirname(__file__)
-
-
-@Gtk.Template(filename=os.path.join(dirname, "app_window.ui"))
+@Gtk.Template(**resources.template("app_window.ui"))
 class AppWindow(Gtk.ApplicationWindow):
     """
     Application entry point.
@@ -26,7 +24,6 @@ class AppWindow(Gtk.ApplicationWindow):
     page_stack = Gtk.Template.Child()
     page_no_mic = Gtk.Template.Child()
     page_mic_init = Gtk.Template.Child()
-    page_mic_control = Gtk.Template.Child()
 
     lock_toggle = Gtk.Template.Child()
     identify_button = Gtk.Template.Child()
@@ -36,60 +33,112 @@ class AppWindow(Gtk.ApplicationWindow):
         super().__init__(*args, **kwargs)
 
         self.set_default_size(600, 400)
-        self.connect("destroy", lambda _: self.close_microphone())
+        self.connect("destroy", lambda _: self.on_destroy())
 
         self.identify_button.connect("clicked", lambda _: self.microphone.identify())
         self.retry_button.connect("clicked", lambda _: self.discover_mics())
 
+        self.manager = MicrophoneManager()
+        self.manager.connect("added", lambda _, mic: self.on_microphone_added(mic))
+        self.manager.connect("removed", lambda _, mic: self.on_microphone_removed(mic))
+        self.manager.connect("failed", lambda *_: self.on_microphone_failed())
+
         self.microphone = None
+
+        # Bindings to the mic being shown
+        self.bindings = BindingGroup()
+
+        # Controls are only built once a mic is ready
+        self.page_mic_control = None
         self.show_all()
-        self.discover_mics()
+
+        try:
+            self.monitor = DeviceMonitor(self.manager)
+        except OSError:
+            # Fall back to scanning when the user asks for it
+            self.monitor = None
+            self.discover_mics()
+        else:
+            # Retrying stays available in case no events get delivered
+            self.show_mic_init()
+            self.monitor.start(lambda _: self.on_scan_done())
 
     def discover_mics(self):
-        """Scan available mics and open the first one available."""
-        mics = Microphone.enumerate()
+        """Open all available mics and wait for the first one to be ready."""
+        self.show_mic_init()
+        self.manager.scan(lambda _: self.on_scan_done())
 
-        if not mics:
+    def on_scan_done(self):
+        """Show that no mic is available if the scan found nothing."""
+        if self.microphone is None and not self.manager.pending:
             self.show_no_mic()
-        else:
-            self.open_microphone(next(iter(mics)))
+
+    def on_destroy(self):
+        """Stop watching devices and close all mics."""
+        if self.monitor is not None:
+            self.monitor.stop()
+
+        self.manager.close_all()
 
     def show_no_mic(self):
         """Show a status page indicating that no mic were found."""
         self.header_stack.set_visible_child(self.header_basic)
         self.page_stack.set_visible_child(self.page_no_mic)
 
-    def open_microphone(self, microphone_path):
-        """Establish a connection to a mic and show a waiting screen."""
-        if self.microphone is not None:
-            self.microphone.close()
-
+    def show_mic_init(self):
+        """Show a waiting screen while connections are being established."""
         self.header_stack.set_visible_child(self.header_basic)
         self.page_stack.set_visible_child(self.page_mic_init)
 
-        self.microphone = Microphone(microphone_path)
-        self.microphone.connect("initialized", lambda _: self.show_control_page())
-        self.microphone.initialize()
+    def on_microphone_added(self, microphone):
+        """Show the controls of the first mic that becomes ready."""
+        if self.microphone is None:
+            self.microphone = microphone
+            self.show_control_page()
+
+    def on_microphone_removed(self, microphone):
+        """Switch to another mic if the one being shown was closed."""
+        if microphone is not self.microphone:
+            return
 
-    def close_microphone(self):
-        """Close the open microphone if applicable."""
-        if self.microphone is not None:
-            self.microphone.close()
-            self.microphone = None
+        self.microphone = None
+        self.bindings.release()
+        self.page_mic_control.props.microphone = None
+        others = self.manager.microphones
+
+        if others:
+            self.on_microphone_added(next(iter(others.values())))
+        elif self.manager.pending:
+            self.show_mic_init()
+        else:
+            self.show_no_mic()
+
+    def on_microphone_failed(self):
+        """Go back to the status page if no connection could be made."""
+        if self.microphone is None and not self.manager.pending:
+            self.show_no_mic()
 
     def show_control_page(self):
         """Show the mic controls once the connection has been established."""
+        if self.page_mic_control is None:
+            from .microphone_control_page import MicrophoneControlPage
+
+            self.page_mic_control = MicrophoneControlPage()
+            self.page_stack.add(self.page_mic_control)
+            self.page_mic_control.show_all()
+
+        self.bindings.release()
         self.page_mic_control.props.microphone = self.microphone
         self.header_mic_control.set_title(self.microphone.props.serial_number)
 
-        self.microphone.bind_property(
-            "lock", self.lock_toggle, "active",
+        self.bindings.bind_property(
+            self.microphone, "lock", self.lock_toggle, "active",
             BindingFlags.BIDIRECTIONAL | BindingFlags.SYNC_CREATE,
         )
 
         for group in self.page_mic_control.get_children():
-            self.microphone.bind_property(
-                "lock", group, "sensitive",
+            self.bindings.bind_property(
+                self.microphone, "lock", group, "sensitive",
                 BindingFlags.INVERT_BOOLEAN | BindingFlags.SYNC_CREATE,
             )
 
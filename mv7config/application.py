@@ -1,8 +1,28 @@
+import logging
+import os
+import time
 import gi
 gi.require_version("Gtk", "3.0")
 gi.require_version("Handy", "1")
 from gi.repository import Gtk, Handy
 from .app_window import AppWindow
+from . import metrics
+
+
+logger = logging.getLogger(__name__)
+
+
+def process_uptime():
+    """Get the number of seconds since the process started, or None."""
+    try:
+        with open("/proc/self/stat") as file:
+            # Skip the process name, which may contain spaces
+            fields = file.read().rpartition(")")[2].split()
+
+        start = int(fields[19]) / os.sysconf("SC_CLK_TCK")
+        return time.clock_gettime(time.CLOCK_BOOTTIME) - start
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
 
 
 class Application(Gtk.Application):
@@ -14,16 +34,53 @@ class Application(Gtk.Application):
         )
         self.window = None
 
+        # Seconds from process start until the first frame was drawn
+        self.startup_duration = None
+
     def do_activate(self):
         if not self.window:
             self.window = AppWindow(application=self, title="mv7config")
+            clock = self.window.get_frame_clock()
+            handler = clock.connect(
+                "after-paint",
+                lambda _: self.on_first_frame(clock, handler),
+            )
 
         self.window.present()
 
+    def on_first_frame(self, clock, handler):
+        """Record how long the application took to show up."""
+        clock.disconnect(handler)
+        self.startup_duration = process_uptime()
+
+        if self.startup_duration is not None:
+            metrics.registry.gauge(
+                "mv7config_startup_seconds",
+                "Seconds from process start until the first frame was drawn",
+            ).set(self.startup_duration)
+            logger.info(
+                f"First frame drawn {self.startup_duration * 1000:.0f} ms "
+                "after process start"
+            )
+
+        if os.environ.get("MV7CONFIG_EXIT_AFTER_FIRST_FRAME"):
+            if self.startup_duration is not None:
+                print(self.startup_duration, flush=True)
+
+            self.quit()
+
     def do_startup(self):
         Gtk.Application.do_startup(self)
         Handy.init()
 
+        port = os.environ.get("MV7CONFIG_METRICS_PORT")
+
+        if port:
+            try:
+                metrics.serve(int(port))
+            except (OSError, ValueError) as err:
+                logger.error(f"Cannot serve metrics on port {port}: {err}")
+
     def do_shutdown(self):
         Gtk.Application.do_shutdown(self)
         self.window.destroy()
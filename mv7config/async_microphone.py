@@ -0,0 +1,367 @@
+import asyncio
+import logging
+import os
+from typing import Dict
+from .text_hid import open_device, enumerate_paths
+from .protocol import (
+    shure_vendor_id,
+    mv7_product_id,
+    mv7_data_interface,
+    fetch_timeout,
+    handshake_timeout,
+    handshake_phases,
+    microphone_properties,
+    mode_reset,
+    decode_message,
+)
+
+
+logger = logging.getLogger(__name__)
+
+# Interval in seconds between two reads on devices that cannot notify the
+# event loop of incoming messages
+poll_interval = .01
+
+# Number of times a property is queried before giving up if the device
+# does not answer it
+max_fetch_attempts = 5
+
+
+class AsyncMicrophone:
+    """
+    Interface with a Shure MV7 microphone from an asyncio event loop.
+
+    Unlike :class:`mv7config.microphone.Microphone`, this class does not
+    depend on GLib and does not start any thread: messages from the device
+    are read by the running event loop, so that a single loop can manage many
+    microphones.
+    """
+    def __init__(
+        self,
+        path=None,
+        handshake_timeout=handshake_timeout,
+        device=None,
+    ):
+        """
+        Prepare a connection to a microphone device.
+
+        :param path: path to the device (keys of
+            :meth:`AsyncMicrophone.enumerate`’s return value)
+        :param handshake_timeout: number of seconds to wait for the device
+            to become ready in :meth:`connect`
+        :param device: already opened device to use instead of opening
+            the device at :param:`path`
+        """
+        self._device = device if device is not None else open_device(path)
+        self._handshake_timeout = handshake_timeout
+        self._state = {}
+        self._waiters = {}
+        self._subscribers = set()
+        self._reader = None
+        self._refetch = None
+
+        # Whether a mode switch was requested and not acknowledged yet
+        self._switching = False
+
+        # Seconds elapsed from the start of the handshake until each of its
+        # phases completed
+        self.handshake_durations = {}
+
+    def enumerate() -> Dict[bytes, Dict]:
+        """List available compatible microphones."""
+        return enumerate_paths(
+            shure_vendor_id,
+            mv7_product_id,
+            mv7_data_interface,
+        )
+
+    async def connect(self, fetch=True):
+        """
+        Initiate communication with the device and fetch properties.
+
+        :param fetch: whether to fetch all properties now, otherwise each
+            property is fetched the first time it is needed
+        :raises asyncio.TimeoutError: if the device does not become ready
+            in time or does not answer queries
+        """
+        loop = asyncio.get_running_loop()
+
+        if hasattr(self._device, "fileno"):
+            loop.add_reader(self._device.fileno(), self._read_available)
+        else:
+            self._reader = loop.create_task(self._poll())
+
+        start = self._device.clock()
+        phases = {}
+
+        for phase, (command, answer) in handshake_phases.items():
+            self._device.send_command(command)
+            phases[phase] = self._wait_for(answer)
+
+        async def complete(phase, answer):
+            await answer
+            self.handshake_durations[phase] = self._device.clock() - start
+
+        await asyncio.wait_for(
+            asyncio.gather(*(
+                complete(phase, answer)
+                for phase, answer in phases.items()
+            )),
+            self._handshake_timeout,
+        )
+
+        await self._fetch(["mode"])
+
+        if fetch:
+            await self._fetch(microphone_properties)
+
+    @property
+    def state(self):
+        """Copy of the known property values, by property name."""
+        return dict(self._state)
+
+    async def get(self, local_name):
+        """
+        Get the value of a property, fetching it if it is not known yet.
+
+        :param local_name: name of the property
+        :raises asyncio.TimeoutError: if the device does not answer
+        """
+        while local_name not in self._state:
+            await self._fetch([local_name])
+
+        return self._state[local_name]
+
+    async def set(self, local_name, value):
+        """
+        Change the value of a property and send it to the device.
+
+        :param local_name: name of the property
+        :param value: new value
+        """
+        await self.apply_profile({local_name: value})
+
+    async def apply_profile(self, profile):
+        """
+        Change several properties at once, sending as few commands as possible.
+
+        Only properties that differ from the current state are sent, and
+        properties sharing a block are sent together. If the profile switches
+        the DSP mode, the switch is completed before mode-specific properties
+        are compared and sent.
+
+        :param profile: mapping of property names to values, such as
+            returned by :func:`mv7config.profile.load_profile`
+        :raises AttributeError: if the profile contains read-only properties
+        """
+        for local_name in profile:
+            if microphone_properties[local_name].format_remote is None:
+                raise AttributeError(f"Property {local_name} is read-only")
+
+        profile = dict(profile)
+
+        if "mode" in profile:
+            await self._switch_mode(profile.pop("mode"))
+
+        commands = {}
+
+        for local_name, value in profile.items():
+            prop = microphone_properties[local_name]
+
+            # Commands for shared blocks need all the values in the block
+            for other_name, other in microphone_properties.items():
+                if other.format_remote is prop.format_remote:
+                    await self.get(other_name)
+
+            value = prop.parse_local(value)
+
+            if value != self._state[local_name]:
+                self._update(local_name, value)
+                commands[prop.fetch_command] = prop.format_remote
+
+        for format_remote in commands.values():
+            self._device.send_command(format_remote(self._state))
+
+    async def _switch_mode(self, mode):
+        """Switch the DSP mode and wait for mode-specific properties."""
+        if mode == await self.get("mode"):
+            return
+
+        answer = self._wait_for("dspMode")
+        self._switching = True
+        self._update("mode", mode)
+        self._device.send_command(
+            microphone_properties["mode"].format_remote(self._state)
+        )
+
+        done, _ = await asyncio.wait([answer], timeout=fetch_timeout)
+
+        if not done:
+            # Switch was not acknowledged, check the current mode
+            self._state.pop("mode")
+            await self._fetch(["mode"])
+
+        if self._refetch is not None:
+            await self._refetch
+
+    async def changes(self):
+        """Iterate over (property name, value) pairs as properties change."""
+        queue = asyncio.Queue()
+        self._subscribers.add(queue)
+
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            self._subscribers.discard(queue)
+
+    async def identify(self):
+        """Ask the device to blink its LEDs."""
+        self._device.send_command("identify")
+
+    async def close(self):
+        """Close connection to the device."""
+        if hasattr(self._device, "fileno"):
+            asyncio.get_running_loop().remove_reader(self._device.fileno())
+
+        for task in (self._reader, self._refetch):
+            if task is not None:
+                task.cancel()
+
+        self._device.close()
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    def _wait_for(self, key):
+        """Get a future resolved when a message with a given prefix arrives."""
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(key, []).append(future)
+        return future
+
+    async def _fetch(self, local_names):
+        """
+        Fetch properties until all of them are known.
+
+        :param local_names: names of the properties to fetch
+        :raises asyncio.TimeoutError: if some properties are still unknown
+            after :data:`max_fetch_attempts` queries
+        """
+        for _ in range(max_fetch_attempts):
+            missing = [
+                name for name in local_names
+                if name not in self._state
+            ]
+
+            if not missing:
+                return
+
+            pending = {}
+
+            for local_name in missing:
+                prop = microphone_properties[local_name]
+
+                if prop.receive_command not in pending:
+                    self._device.send_command(prop.fetch_command)
+                    pending[prop.receive_command] = self._wait_for(
+                        prop.receive_command
+                    )
+
+            # Unanswered queries are sent again on the next iteration
+            await asyncio.wait(pending.values(), timeout=fetch_timeout)
+
+        if missing := [
+            name for name in local_names
+            if name not in self._state
+        ]:
+            raise asyncio.TimeoutError(
+                "Device did not answer queries for: " + ", ".join(missing)
+            )
+
+    async def _poll(self):
+        """Read messages from devices that have no file descriptor."""
+        while True:
+            while message := self._device.read_message():
+                self._on_message(message)
+
+            await asyncio.sleep(poll_interval)
+
+    def _read_available(self):
+        """Read messages when the device file descriptor is readable."""
+        while message := self._device.read_message():
+            self._on_message(message)
+
+    def _on_message(self, message):
+        """Update the state from a message and wake up its waiters."""
+        decoded = decode_message(message)
+
+        if decoded is None:
+            key = message.strip()
+        else:
+            key, values = decoded
+
+            for local_name, next_value in values:
+                # Mode-specific properties only change with the mode
+                if local_name == "mode" and (
+                    self._switching
+                    or self._state.get("mode", next_value) != next_value
+                ):
+                    self._switching = False
+
+                    for reset_key in mode_reset:
+                        self._state.pop(reset_key, None)
+
+                    if self._refetch is None or self._refetch.done():
+                        self._refetch = asyncio.get_running_loop().create_task(
+                            self._fetch(mode_reset)
+                        )
+
+                if self._state.get(local_name) != next_value:
+                    self._update(local_name, next_value)
+
+        for future in self._waiters.pop(key, ()):
+            if not future.done():
+                future.set_result(message)
+
+    def _update(self, local_name, value):
+        """Store a new property value and publish it to subscribers."""
+        self._state[local_name] = value
+
+        for queue in self._subscribers:
+            queue.put_nowait((local_name, value))
+
+
+async def connect_all(**microphone_args):
+    """
+    Connect to all available microphones concurrently.
+
+    :param microphone_args: arguments passed to each
+        :class:`AsyncMicrophone`
+    :returns: mapping of serial numbers to connected microphones
+    """
+    microphones = []
+
+    for path in AsyncMicrophone.enumerate():
+        try:
+            microphones.append(AsyncMicrophone(path, **microphone_args))
+        except OSError as err:
+            logger.error(f"Cannot open {os.fsdecode(path)}: {err}")
+
+    results = await asyncio.gather(
+        *(microphone.connect() for microphone in microphones),
+        return_exceptions=True,
+    )
+    connected = {}
+
+    for microphone, result in zip(microphones, results):
+        if isinstance(result, Exception):
+            logger.error(f"Cannot connect to microphone: {result}")
+            await microphone.close()
+        else:
+            connected[await microphone.get("serial_number")] = microphone
+
+    return connected
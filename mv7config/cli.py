@@ -0,0 +1,202 @@
+import argparse
+import json
+import os
+import sys
+from .text_hid import enumerate_paths
+from .protocol import (
+    shure_vendor_id,
+    mv7_product_id,
+    mv7_data_interface,
+    microphone_properties,
+    Mode,
+    state_to_json,
+    state_from_json,
+)
+from .profile import (
+    profile_properties,
+    profile_from_state,
+    check_value,
+    load_profile,
+    save_profile,
+)
+
+
+def list_devices():
+    """List paths of the attached microphones."""
+    return enumerate_paths(shure_vendor_id, mv7_product_id, mv7_data_interface)
+
+
+def format_value(value):
+    """Format a property value for printing."""
+    value = state_to_json({"value": value})["value"]
+    return value if isinstance(value, str) else json.dumps(value)
+
+
+def parse_value(local_name, text):
+    """
+    Parse a value given on the command line for a property.
+
+    Booleans and numbers use the JSON syntax and enumerations use the name
+    of their values, as in profiles.
+
+    :raises ValueError: if the value does not fit the property
+    """
+    prop = microphone_properties[local_name]
+
+    try:
+        value = json.loads(text)
+    except ValueError:
+        value = text
+
+    if prop.enum is not None:
+        names = [
+            member.name for member in prop.enum
+            if member is not Mode.Loading
+        ]
+
+        if str(value) not in names:
+            raise ValueError(
+                f"Invalid value for {local_name}: {text} "
+                f"(expected {', '.join(names)})"
+            )
+
+        return state_from_json({local_name: str(value)})[local_name]
+
+    check_value(local_name, value)
+    return value
+
+
+async def run_command(args, path):
+    """Connect to a microphone and run a command that needs the device."""
+    from .async_microphone import AsyncMicrophone
+
+    microphone = AsyncMicrophone(path)
+
+    try:
+        await microphone.connect(fetch=args.command == "dump")
+
+        if args.command == "get":
+            for local_name in args.names:
+                print(format_value(await microphone.get(local_name)))
+        elif args.command == "set":
+            await microphone.set(args.name, args.value)
+        elif args.command == "dump":
+            state = microphone.state
+
+            if not args.all:
+                state = profile_from_state(state)
+
+            if args.output is None:
+                json.dump(state_to_json(state), sys.stdout, indent=4)
+                print()
+            else:
+                save_profile(state, args.output)
+        elif args.command == "apply":
+            await microphone.apply_profile(args.profile)
+    finally:
+        await microphone.close()
+
+
+def make_parser():
+    parser = argparse.ArgumentParser(
+        prog="mv7config",
+        description="Configure Shure MV7 microphones.",
+    )
+    parser.add_argument(
+        "-d", "--device",
+        type=os.fsencode,
+        help="path to the device to use, needed if several are attached",
+    )
+    parser.add_argument(
+        "--metrics",
+        metavar="FILE",
+        help="save a JSON snapshot of traffic and latency metrics on exit",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("list", help="list attached microphones")
+
+    get_parser = commands.add_parser("get", help="print property values")
+    get_parser.add_argument(
+        "names", nargs="+", metavar="name",
+        choices=list(microphone_properties),
+    )
+
+    set_parser = commands.add_parser("set", help="change a property value")
+    set_parser.add_argument("name", choices=profile_properties)
+    set_parser.add_argument("value")
+
+    dump_parser = commands.add_parser("dump", help="save settings as a profile")
+    dump_parser.add_argument(
+        "-o", "--output",
+        help="file to save the profile to, instead of printing it",
+    )
+    dump_parser.add_argument(
+        "-a", "--all", action="store_true",
+        help="also include read-only properties, ignored when applied",
+    )
+
+    apply_parser = commands.add_parser("apply", help="apply a saved profile")
+    apply_parser.add_argument("profile", type=load_profile)
+
+    return parser
+
+
+def main(argv=None):
+    parser = make_parser()
+    args = parser.parse_args(argv)
+
+    if args.command == "set":
+        try:
+            args.value = parse_value(args.name, args.value)
+        except ValueError as err:
+            parser.error(str(err))
+
+    if args.command == "list":
+        for path, info in list_devices().items():
+            print(os.fsdecode(path), info.get("serial_number", ""), sep="\t")
+
+        return 0
+
+    if args.device is not None:
+        path = args.device
+    else:
+        devices = list_devices()
+
+        if not devices:
+            print("No MV7 microphone found", file=sys.stderr)
+            return 1
+
+        if len(devices) > 1:
+            print(
+                "Several MV7 microphones found, choose one with --device",
+                file=sys.stderr,
+            )
+            return 1
+
+        path = next(iter(devices))
+
+    # Only imported once the device is actually needed, so that other
+    # commands start quickly
+    import asyncio
+
+    try:
+        asyncio.run(run_command(args, path))
+    except OSError as err:
+        print(f"Cannot open {os.fsdecode(path)}: {err}", file=sys.stderr)
+        return 1
+    except asyncio.TimeoutError:
+        print("Microphone did not answer", file=sys.stderr)
+        return 1
+    finally:
+        if args.metrics is not None:
+            from .metrics import registry
+
+            with open(args.metrics, "w") as file:
+                json.dump(registry.snapshot(), file, indent=4)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
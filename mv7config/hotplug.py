@@ -0,0 +1,202 @@
+import os
+import socket
+import struct
+from gi.repository import GLib
+from . import sysfs
+
+
+# Netlink protocol of device events, not exposed by the socket module
+netlink_kobject_uevent = 15
+
+# Netlink multicast group of events sent by the kernel
+kernel_monitor_group = 1
+
+# Netlink multicast group of events sent by udev once its rules are applied
+udev_monitor_group = 2
+
+# Control socket created by udevd while it is running
+udev_control_path = "/run/udev/control"
+
+
+def udev_running():
+    """Check whether udevd is running and rebroadcasting device events."""
+    return os.path.exists(udev_control_path)
+
+
+def parse_uevent(data):
+    """
+    Parse a device event received from netlink.
+
+    Accepts both raw kernel events and events rebroadcast by udev.
+
+    :param data: message received from the socket
+    :returns: dict of event properties
+    """
+    if data.startswith(b"libudev\0"):
+        # Skip the binary udev header, which gives the properties location
+        offset, length = struct.unpack_from("=II", data, 16)
+        data = data[offset:offset + length]
+
+    properties = {}
+
+    for field in data.split(b"\0"):
+        key, equal, value = field.partition(b"=")
+
+        if equal:
+            properties[key.decode()] = os.fsdecode(value)
+
+    return properties
+
+
+class UeventSource:
+    """
+    Source of events for MV7 hidraw devices being added or removed,
+    read from the netlink socket on which the kernel and udev broadcast
+    device changes.
+    """
+    def __init__(self, group=None):
+        """
+        Subscribe to device events.
+
+        :param group: netlink multicast group to subscribe to, by default
+            the udev group if udev is running, so that devices are only
+            reported once their permissions are set, and the kernel group
+            otherwise, since nothing is sent to the udev group without it
+        :raises OSError: if netlink is not available
+        """
+        if group is None:
+            group = (
+                udev_monitor_group if udev_running()
+                else kernel_monitor_group
+            )
+
+        self._socket = socket.socket(
+            socket.AF_NETLINK,
+            socket.SOCK_DGRAM | socket.SOCK_NONBLOCK | socket.SOCK_CLOEXEC,
+            netlink_kobject_uevent,
+        )
+        self._socket.bind((0, group))
+
+    def fileno(self):
+        return self._socket.fileno()
+
+    def close(self):
+        self._socket.close()
+
+    def read_events(self):
+        """
+        Read pending events without blocking.
+
+        :returns: list of (action, path, serial_number) tuples, where
+            action is either "add" or "remove", path is the device node and
+            serial_number is the USB serial number of added devices
+        """
+        events = []
+
+        while True:
+            try:
+                data = self._socket.recv(16384)
+            except BlockingIOError:
+                return events
+
+            properties = parse_uevent(data)
+
+            if properties.get("SUBSYSTEM") != "hidraw":
+                continue
+
+            action = properties.get("ACTION")
+            path = os.fsencode(
+                os.path.join("/dev", properties.get("DEVNAME", ""))
+            )
+
+            if action == "remove":
+                events.append((action, path, None))
+            elif action == "add":
+                info = sysfs.microphone_info(
+                    sysfs.sysfs_root + properties.get("DEVPATH", "")
+                )
+
+                if info is not None:
+                    events.append(
+                        (action, path, info["serial_number"] or None)
+                    )
+
+
+class ManualEventSource:
+    """Source of device events pushed by the program, for testing."""
+    def __init__(self):
+        self._read, self._write = os.pipe()
+        self._events = []
+
+    def fileno(self):
+        return self._read
+
+    def close(self):
+        os.close(self._read)
+        os.close(self._write)
+
+    def push(self, action, path, serial_number=None):
+        """Signal that a device was added or removed."""
+        self._events.append((action, path, serial_number))
+        os.write(self._write, b"\0")
+
+    def read_events(self):
+        os.read(self._read, 4096)
+        events, self._events = self._events, []
+        return events
+
+
+class DeviceMonitor:
+    """
+    Open and close the microphones of a manager as devices are plugged in
+    and unplugged.
+
+    Events are watched from the GLib main loop, so that no device scan
+    happens until a device is actually added or removed.
+    """
+    def __init__(self, manager, source=None):
+        """
+        Create a device monitor.
+
+        :param manager: :class:`mv7config.microphone_manager.MicrophoneManager`
+            to keep in sync with attached devices
+        :param source: source of device events, a new :class:`UeventSource`
+            by default
+        :raises OSError: if no source is given and netlink is not available
+        """
+        self._manager = manager
+        self._source = source if source is not None else UeventSource()
+        self._watch = None
+
+    def start(self, done=None):
+        """
+        Open attached microphones and start watching for changes.
+
+        :param done: function called once attached microphones are open,
+            see :meth:`mv7config.microphone_manager.MicrophoneManager.scan`
+        """
+        # Subscribe before scanning so that no device is missed in between
+        self._watch = GLib.io_add_watch(
+            self._source.fileno(),
+            GLib.PRIORITY_DEFAULT,
+            GLib.IO_IN,
+            self._on_readable,
+        )
+        self._manager.scan(done)
+
+    def stop(self):
+        """Stop watching for changes."""
+        if self._watch is not None:
+            GLib.source_remove(self._watch)
+            self._watch = None
+
+        self._source.close()
+
+    def _on_readable(self, fd, condition):
+        for action, path, serial_number in self._source.read_events():
+            if action == "add":
+                self._manager.open(path, serial_number)
+            else:
+                self._manager.close(path)
+
+        return True
@@ -0,0 +1,257 @@
+"""
+Counters and histograms describing the exchanges with the devices.
+
+Metrics are cheap enough to stay enabled: histograms have fixed buckets, so
+recording a sample only increments existing counts. They can be exported as
+a JSON snapshot or in the Prometheus text format, and served over HTTP.
+"""
+import bisect
+import json
+import math
+import threading
+
+
+# Bucket bounds, in seconds, for the latencies of exchanges with the device
+latency_buckets = (
+    .0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5,
+)
+
+# Bucket bounds, in seconds, for work done on the host per message
+processing_buckets = (
+    .00001, .000025, .00005, .0001, .00025, .0005, .001, .0025, .005, .01,
+)
+
+# Bucket bounds for numbers of queued items
+depth_buckets = (0, 1, 2, 4, 8, 16, 32, 64)
+
+
+class Counter:
+    """Value that only increases, such as a number of events."""
+    kind = "counter"
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def snapshot(self):
+        return self.value
+
+
+class Gauge:
+    """Value that can go up and down, such as a number of open devices."""
+    kind = "gauge"
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def snapshot(self):
+        return self.value
+
+
+class Histogram:
+    """Distribution of samples over a fixed set of buckets."""
+    kind = "histogram"
+
+    def __init__(self, buckets):
+        """
+        Create an empty histogram.
+
+        :param buckets: increasing upper bounds of the buckets, a last bucket
+            without upper bound is added
+        """
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self):
+        with self._lock:
+            counts = list(self.counts)
+            total, count = self.sum, self.count
+
+        return {
+            "buckets": dict(zip(
+                (*map(str, self.buckets), "+Inf"),
+                counts,
+            )),
+            "sum": total,
+            "count": count,
+        }
+
+
+class Registry:
+    """
+    Set of named metrics.
+
+    Metrics are identified by their name and labels, and asking for an
+    existing one returns it instead of creating a new one.
+    """
+    def __init__(self):
+        # Map each name to its help text and its metrics, keyed by labels
+        self._families = {}
+        self._lock = threading.Lock()
+
+    def _get(self, factory, name, help, labels):
+        key = tuple(sorted(labels.items()))
+
+        with self._lock:
+            help, metrics = self._families.setdefault(name, (help, {}))
+
+            if key not in metrics:
+                metrics[key] = factory()
+
+            return metrics[key]
+
+    def counter(self, name, help, **labels):
+        """Get the counter with a given name and labels."""
+        return self._get(Counter, name, help, labels)
+
+    def gauge(self, name, help, **labels):
+        """Get the gauge with a given name and labels."""
+        return self._get(Gauge, name, help, labels)
+
+    def histogram(self, name, help, buckets=latency_buckets, **labels):
+        """Get the histogram with a given name and labels."""
+        return self._get(lambda: Histogram(buckets), name, help, labels)
+
+    def _collect(self):
+        with self._lock:
+            return [
+                (name, help, list(metrics.items()))
+                for name, (help, metrics) in sorted(self._families.items())
+            ]
+
+    def snapshot(self):
+        """
+        Get the current values of all metrics, in a form that can be
+        serialized to JSON.
+
+        :returns: dict mapping each metric name to a list of dicts holding
+            the labels and the value of each metric
+        """
+        return {
+            name: [
+                {"labels": dict(key), "value": metric.snapshot()}
+                for key, metric in metrics
+            ]
+            for name, _, metrics in self._collect()
+        }
+
+    def to_prometheus(self):
+        """Format the current values of all metrics in the Prometheus text
+        exposition format."""
+        lines = []
+
+        for name, help, metrics in self._collect():
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {metrics[0][1].kind}")
+
+            for key, metric in metrics:
+                if metric.kind != "histogram":
+                    lines.append(
+                        f"{name}{_format_labels(key)} "
+                        f"{_format_number(metric.snapshot())}"
+                    )
+                    continue
+
+                value = metric.snapshot()
+                cumulative = 0
+
+                for bound, count in value["buckets"].items():
+                    cumulative += count
+                    labels = _format_labels(key + (("le", bound),))
+                    lines.append(f"{name}_bucket{labels} {cumulative}")
+
+                labels = _format_labels(key)
+                lines.append(
+                    f"{name}_sum{labels} {_format_number(value['sum'])}"
+                )
+                lines.append(f"{name}_count{labels} {value['count']}")
+
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(key):
+    if not key:
+        return ""
+
+    return "{" + ",".join(
+        f'{label}={json.dumps(str(value))}'
+        for label, value in key
+    ) + "}"
+
+
+def _format_number(value):
+    if isinstance(value, float) and math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+
+    return repr(value)
+
+
+# Registry receiving the metrics of all devices
+registry = Registry()
+
+
+def serve(port, address="127.0.0.1"):
+    """
+    Serve the metrics over HTTP from a background thread.
+
+    The Prometheus text format is served at /metrics and a JSON snapshot
+    at /metrics.json.
+
+    :param port: port to listen on
+    :param address: address to listen on, only the local host by default
+    :returns: server, whose shutdown method stops serving
+    :raises OSError: if the port cannot be listened on
+    """
+    # Only imported when serving, to keep the command line quick to start
+    import http.server
+
+    class MetricsHandler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == "/metrics":
+                body = registry.to_prometheus().encode()
+                content_type = "text/plain; version=0.0.4; charset=utf-8"
+            elif self.path == "/metrics.json":
+                body = json.dumps(registry.snapshot()).encode()
+                content_type = "application/json"
+            else:
+                self.send_error(404)
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer((address, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -1,354 +1,786 @@
+import contextlib
 import threading
-from typing import Any, Dict, Callable
-from dataclasses import dataclass
-from enum import Enum
+import logging
+import math
+from typing import Dict
 import time
+from types import MappingProxyType
 from gi.repository import GObject, GLib
-import hid
-from .text_hid import TextHID
-
-
-# USB vendor ID for Shure products
-shure_vendor_id = 0x14ED
-
-# USB product ID for the MV7
-mv7_product_id = 0x1012
-
-# USB interface for the data HID communications
-mv7_data_interface = 3
-
-
-class Mode(Enum):
-    """Modes for the Shure MV7 DSP."""
-    # Currently switching between the two modes
-    Loading = 0
-
-    # Filters are tuned by the user
-    Manual = 1
-
-    # Filters are chosen based on a limited set of presets
-    Auto = 2
-
-
-class CompressorState(Enum):
-    """Settings for the compressor."""
-    Off = 0
-    Light = 1
-    Medium = 2
-    Heavy = 3
-
-
-class DistanceState(Enum):
-    """User distance to microphone in auto mode."""
-    Off = -1
-    Close = 1
-    Far = 4
-
-    def parse(x):
-        """Extract the distance component from the combined auto setting."""
-        value = int(x, 16)
-
-        if value >= DistanceState.Far.value:
-            return DistanceState.Far
-        elif value >= DistanceState.Close.value:
-            return DistanceState.Close
-        else:
-            return DistanceState.Off
-
-
-class ToneState(Enum):
-    """Tone in auto mode."""
-    Off = -1
-    Neutral = 0
-    Dark = 1
-    Bright = 2
-
-    def parse(x):
-        """Extract the tone component from the combined auto setting."""
-        value = int(x, 16)
-
-        if value >= DistanceState.Far.value:
-            return ToneState(value - DistanceState.Far.value)
-        elif value >= DistanceState.Close.value:
-            return ToneState(value - DistanceState.Close.value)
-        else:
-            return ToneState.Off
-
-
-@dataclass
-class MicrophoneProperty:
-    """Represents a property that can be read from the HID interface."""
-    # Name used in the Microphone class’s _state dict
-    local_name: str
-
-    # HID command used to query the current value of the property
-    fetch_command: str
-
-    # HID prefix signaling the answer to the property query
-    receive_command: str
-
-    # Filter for parsing the answer to the appropriate Python type
-    parse_remote: Callable[str, Any]
-
-
-microphone_properties = {
-    prop.local_name: prop
-    for prop in [
-        MicrophoneProperty(
-            local_name="package_version",
-            fetch_command="pkgVersion",
-            receive_command="pkgVersion",
-            parse_remote=lambda x: x,
-        ),
-        MicrophoneProperty(
-            local_name="firmware_version",
-            fetch_command="fwVersion",
-            receive_command="fwVersion",
-            parse_remote=lambda x: x,
-        ),
-        MicrophoneProperty(
-            local_name="dsp_version",
-            fetch_command="dspVersion",
-            receive_command="dspVersion",
-            parse_remote=lambda x: x,
-        ),
-        MicrophoneProperty(
-            local_name="serial_number",
-            fetch_command="serialNum",
-            receive_command="serialNum",
-            parse_remote=lambda x: x,
-        ),
-        MicrophoneProperty(
-            local_name="lock",
-            fetch_command="lock",
-            receive_command="lock",
-            parse_remote=lambda x: x == "on",
-        ),
-        MicrophoneProperty(
-            local_name="monitor_mute",
-            fetch_command="audioMute",
-            receive_command="audioMute",
-            parse_remote=lambda x: x == "on",
-        ),
-        MicrophoneProperty(
-            local_name="monitor_volume",
-            fetch_command="volume",
-            receive_command="volume",
-            parse_remote=lambda x: int(float(x[:-2]) * 100),
-        ),
-        MicrophoneProperty(
-            local_name="mode",
-            fetch_command="dspMode",
-            receive_command="dspMode",
-            parse_remote=lambda x: Mode.Manual if x == "1" else Mode.Auto,
-        ),
-        MicrophoneProperty(
-            local_name="input_mute",
-            fetch_command="micMute",
-            receive_command="micMute",
-            parse_remote=lambda x: x == "on",
-        ),
-        MicrophoneProperty(
-            local_name="input_volume",
-            fetch_command="inputGain",
-            receive_command="inputGain",
-            parse_remote=lambda x: int(float(x[:-2]) * 100),
-        ),
-        MicrophoneProperty(
-            local_name="monitor_mix_pc",
-            fetch_command="getBlock 22",
-            receive_command="22",
-            parse_remote=lambda x: int(x[:8], 16),
-        ),
-        MicrophoneProperty(
-            local_name="monitor_mix_mic",
-            fetch_command="getBlock 22",
-            receive_command="22",
-            parse_remote=lambda x: int(x[8:], 16),
-        ),
-        MicrophoneProperty(
-            local_name="compressor",
-            fetch_command="getBlock 19",
-            receive_command="19",
-            parse_remote=lambda x: CompressorState(int(x, 16)),
-        ),
-        MicrophoneProperty(
-            local_name="limiter",
-            fetch_command="getBlock 1F",
-            receive_command="1F",
-            parse_remote=lambda x: x == "00000001",
-        ),
-        MicrophoneProperty(
-            local_name="high_pass_filter",
-            fetch_command="getBlock 31",
-            receive_command="31",
-            parse_remote=lambda x: int(x, 16) & 1 != 0,
-        ),
-        MicrophoneProperty(
-            local_name="presence_filter",
-            fetch_command="getBlock 31",
-            receive_command="31",
-            parse_remote=lambda x: int(x, 16) & 2 != 0,
-        ),
-        MicrophoneProperty(
-            local_name="auto_distance",
-            fetch_command="getBlock 34",
-            receive_command="34",
-            parse_remote=lambda x: DistanceState.parse(x),
-        ),
-        MicrophoneProperty(
-            local_name="auto_tone",
-            fetch_command="getBlock 34",
-            receive_command="34",
-            parse_remote=lambda x: ToneState.parse(x),
-        ),
-    ]
-}
-
-# List of properties that are changed when the DSP mode is switched
-# between auto and manual
-mode_reset = [
-    "input_volume",
-    "compressor",
-    "limiter",
-    "high_pass_filter",
-    "presence_filter",
-    "auto_distance",
-    "auto_tone",
-]
+from .text_hid import open_device, enumerate_paths
+from .write_scheduler import WriteScheduler, Priority
+from . import state_cache
+from .metrics import registry, processing_buckets, depth_buckets
+from .protocol import (
+    shure_vendor_id,
+    mv7_product_id,
+    mv7_data_interface,
+    fetch_timeout,
+    handshake_timeout,
+    handshake_phases,
+    Mode,
+    CompressorState,
+    DistanceState,
+    ToneState,
+    microphone_properties,
+    firmware_properties,
+    mode_reset,
+    decode_message,
+)
+
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of commands sent per second for each property or block,
+# further changes are collapsed to the newest value
+max_write_rate = 20
+
+# Maximum number of commands sent per second in total, on average, and
+# maximum number of commands sent at once, which is enough to query all
+# properties in one go
+max_command_rate = 100
+max_command_burst = 16
+
+# Number of times a change is sent before giving up if the device does not
+# confirm it, waiting twice as long for each new attempt
+max_write_attempts = 3
+
+# Time taken by the device to answer, by the I/O thread to handle messages
+# and by the main loop to process notifications, to tell where delays come
+# from
+_round_trip = registry.histogram(
+    "mv7config_round_trip_seconds",
+    "Seconds from sending a command until the device answered it",
+)
+_parse_time = registry.histogram(
+    "mv7config_parse_seconds",
+    "Seconds spent parsing and applying each message from the device",
+    processing_buckets,
+)
+_main_loop_delay = registry.histogram(
+    "mv7config_main_loop_delay_seconds",
+    "Seconds from a state change until the main loop notified it",
+)
+_queue_depth = registry.histogram(
+    "mv7config_write_queue_depth",
+    "Commands waiting to be sent each time the I/O thread sends commands",
+    depth_buckets,
+)
 
 
 class Microphone(GObject.Object):
-    """Interface with a Shure MV7 microphone via the USB HID interface."""
+    """
+    Interface with a Shure MV7 microphone via the USB HID interface.
+
+    The device is only accessed from a background I/O thread, which sends
+    queued commands and reads messages. The state of the device is published
+    as read-only snapshots, which are replaced instead of being modified, so
+    that the main thread can read it at any time and never waits for the
+    device.
+    """
     __gsignals__ = {
         # Emitted when an instance has finished fetching its initial state
         "initialized": (GObject.SIGNAL_RUN_FIRST, None, ()),
+
+        # Emitted if the connection could not be established, with a
+        # description of the failure
+        "failed": (GObject.SIGNAL_RUN_FIRST, None, (str,)),
     }
 
-    def __init__(self, path):
+    def __init__(
+        self,
+        path=None,
+        handshake_timeout=handshake_timeout,
+        max_write_rate=max_write_rate,
+        device=None,
+        use_cache=True,
+        serial_number=None,
+    ):
         """
         Open a microphone device.
 
         :param path: path to the device (keys of
             :meth:`Microphone.enumerate`’s return value)
+        :param handshake_timeout: number of seconds to wait for the device
+            to become ready before emitting the failed signal
+        :param max_write_rate: maximum number of commands sent per second
+            when a property is changed repeatedly
+        :param device: already opened device to use instead of opening
+            the device at :param:`path`, such as a
+            :class:`mv7config.simulator.SimulatedDevice`
+        :param use_cache: whether to start from the state saved during the
+            last session with the same device, if any
+        :param serial_number: USB serial number of the device, as listed by
+            :meth:`Microphone.enumerate`, under which its state is saved
         """
         super().__init__()
-        self._device = TextHID(path)
-        self._state = {}
+        self._device = device if device is not None else open_device(path)
+        self._handshake_timeout = handshake_timeout
+        self._writer = WriteScheduler(
+            max_write_rate,
+            clock=self._device.clock,
+            wakeup=self._device.wakeup,
+            max_total_rate=max_command_rate,
+            max_burst=max_command_burst,
+        )
+
+        # Current snapshot of the device state, and lock ordering the
+        # publication of new snapshots from the main and I/O threads
+        self._state = MappingProxyType({})
+        self._state_lock = threading.Lock()
+
+        # Last values reported by the device, to which unconfirmed changes
+        # are reverted (only used by the I/O thread)
+        self._confirmed = {}
+
+        # Latest command sent or queued for each changed property or block
+        # that the device did not confirm yet, guarded by the state lock
+        self._intents = {}
+
+        # Number of times the changes that were sent have been sent, and
+        # their confirmation deadline or None while they are queued to be
+        # sent again, guarded by the state lock
+        self._unconfirmed = {}
+
+        # Time at which the last command for each property or block was sent,
+        # to measure how long the device takes to answer (only used by the
+        # I/O thread)
+        self._sent_at = {}
+
+        # Properties changed by the I/O thread that were not notified on the
+        # main thread yet, in order and without duplicates
+        self._dirty = {}
+        self._dirty_lock = threading.Lock()
+        self._dirty_since = None
+
+        self._batch = None
+        self._cache_key = serial_number if use_cache else None
+        self._cache_revalidate = []
+
+        # Mode targeted by the last mode switch requested by a profile, and
+        # the mode-specific values of the profile, guarded by the state lock
+        self._deferred_profile = None
+
+        # Seconds elapsed from the start of the handshake until each of its
+        # phases completed
+        self.handshake_durations = {}
+
         self._switching_modes_sending = threading.Event()
         self._switching_modes_fetching = threading.Event()
         self._stop_event = threading.Event()
-        self._reader_thread = threading.Thread(target=self._reader_thread_run)
+        self._io_thread = threading.Thread(target=self._io_thread_run)
 
     def enumerate() -> Dict[bytes, Dict]:
         """List available compatible microphones."""
-        return {
-            match["path"]: match
-            for match in hid.enumerate(shure_vendor_id, mv7_product_id)
-            if match["interface_number"] == mv7_data_interface
-        }
+        return enumerate_paths(
+            shure_vendor_id,
+            mv7_product_id,
+            mv7_data_interface,
+        )
+
+    @property
+    def state(self):
+        """Read-only snapshot of the known property values."""
+        return self._state
+
+    @property
+    def queue_depth(self):
+        """Number of commands waiting to be sent, by priority class."""
+        return self._writer.depth()
 
     def initialize(self):
-        """Initiate communication with the device and fetch properties."""
-        self._reader_thread.start()
+        """
+        Initiate communication with the device and fetch properties.
 
-    def _reader_thread_run(self):
-        """Background loop for reading messages from the device."""
-        # Set user to admin, otherwise some commands are not usable
-        self._device.send_command("su adm")
-        while self._device.read_message() != "su=adm\n":
-            pass
+        If a state was saved during the last session with the device, it is
+        published and the initialized signal is emitted before this returns,
+        without waiting for the device, whose values are then checked in the
+        background.
+        """
+        if self._restore_cache():
+            self.emit("initialized")
 
-        # Wait until the DSP has booted
-        self._device.send_command("bootDSP C")
-        while self._device.read_message() != "dspBooted\n":
-            pass
+        self._io_thread.start()
 
-        # Initial property fetching
-        while self._fetch_fields():
-            pass
+    def _io_thread_run(self):
+        """Background loop exchanging messages with the device."""
+        try:
+            self._communicate()
 
-        GLib.idle_add(lambda: self.emit("initialized"))
+            # Send changes made until the connection was closed
+            for command in self._writer.drain():
+                self._device.send_command(command)
+        except OSError as err:
+            # The device was most likely unplugged
+            logger.error(f"Lost connection to the device: {err}")
+            GLib.idle_add(self.emit, "failed", str(err))
+
+    def _communicate(self):
+        try:
+            if not self._handshake():
+                return
+        except TimeoutError as err:
+            logger.error(err)
+            GLib.idle_add(self.emit, "failed", str(err))
+            return
 
-        while not self._stop_event.is_set():
-            # Fetch missing fields (if the DSP mode was changed)
-            message = self._device.read_message(timeout_ms=200)
+        if self._cache_revalidate:
+            self._revalidate_cache()
+        else:
+            # Initial property fetching
+            while not self._stop_event.is_set() and self._fetch_fields():
+                pass
 
-            if message:
-                self._parse_message(message)
+            GLib.idle_add(lambda: self.emit("initialized"))
 
+        while not self._stop_event.is_set():
+            # Fetch missing fields (if the DSP mode was changed)
             if self._switching_modes_fetching.is_set():
-                while self._fetch_fields():
+                while not self._stop_event.is_set() and self._fetch_fields():
                     pass
 
                 self._switching_modes_fetching.clear()
                 self._notify_on_main_thread("mode")
 
+                GLib.idle_add(self._apply_deferred_profile)
+
+            # Wait until a message arrives, a command is queued or the
+            # connection is closed
+            message = self._read_message()
+
+            if message:
+                self._parse_message(message)
+
+    def _restore_cache(self):
+        """
+        Restore the state saved during the last session with the device.
+
+        The saved state is found from the USB serial number of the device,
+        so that it is restored before communicating with the device. Fields
+        that may have changed since are marked for revalidation, along with
+        the firmware version.
+
+        :returns: True if the state was restored
+        """
+        if self._cache_key is None:
+            return False
+
+        cached = state_cache.load(self._cache_key)
+
+        if cached is None:
+            return False
+
+        # Not yet used by the I/O thread, which is only started afterwards
+        self._publish(cached)
+        self._confirmed.update(cached)
+        self._cache_revalidate = ["firmware_version"] + [
+            local_name for local_name in microphone_properties
+            if local_name not in firmware_properties
+        ]
+        return True
+
+    def _revalidate_cache(self):
+        """Query the restored values again, and all of them after an update."""
+        saved_firmware = self._state.get("firmware_version")
+        remaining = self._cache_revalidate
+
+        while remaining and not self._stop_event.is_set():
+            remaining = self._query(remaining, Priority.Diagnostics)
+
+        if self._state.get("firmware_version") != saved_firmware:
+            logger.info("Firmware was updated, discarding saved state")
+            remaining = [
+                local_name for local_name in firmware_properties
+                if local_name not in self._cache_revalidate
+            ]
+
+            while remaining and not self._stop_event.is_set():
+                remaining = self._query(remaining)
+
+    def _handshake(self):
+        """
+        Log in as admin and boot the DSP.
+
+        :returns: False if the connection was closed during the handshake
+        :raises TimeoutError: if the device does not answer in time
+        """
+        start = self._device.clock()
+        deadline = start + self._handshake_timeout
+        phases = {}
+
+        for phase, (command, answer) in handshake_phases.items():
+            self._writer.write(command, command, Priority.Sync)
+            phases[answer] = phase
+
+        while phases:
+            if self._stop_event.is_set():
+                return False
+
+            remaining = deadline - self._device.clock()
+
+            if remaining <= 0:
+                raise TimeoutError(
+                    "Device did not complete handshake phases: "
+                    + ", ".join(phases.values())
+                )
+
+            # Changes are held back until the device is ready for them
+            message = self._read_message(remaining, (Priority.Sync,))
+
+            if message and (phase := phases.pop(message.strip(), None)):
+                duration = self._device.clock() - start
+                self.handshake_durations[phase] = duration
+                registry.histogram(
+                    "mv7config_handshake_seconds",
+                    "Seconds from the start of the handshake until each of "
+                    "its phases completed",
+                    phase=phase,
+                ).observe(duration)
+
+        return True
+
     def _fetch_fields(self):
-        """Fetch all missing fields in the _state dict."""
-        commands = set()
+        """
+        Fetch all missing fields in the _state dict.
+
+        Unanswered fields are left missing so that the next call asks for
+        them again.
 
+        :returns: True if some fields were missing when called
+        """
         if "mode" not in self._state:
-            commands.add(microphone_properties["mode"].fetch_command)
+            missing = ["mode"]
         else:
-            for local_name, prop in microphone_properties.items():
-                if local_name not in self._state:
-                    commands.add(prop.fetch_command)
+            missing = [
+                local_name for local_name in microphone_properties
+                if local_name not in self._state
+            ]
 
-        if commands:
-            # Send requests for missing state
-            for command in commands:
-                self._device.send_command(command)
+        if not missing:
+            return False
 
-            # Give time to the device to respond
-            time.sleep(.5)
+        self._query(missing)
+        return True
 
-            while (message := self._device.read_message(timeout_ms=200)):
-                self._parse_message(message)
+    def _query(self, local_names, priority=Priority.Sync):
+        """
+        Ask the device for the current value of a set of fields.
 
-            return True
-        else:
-            return False
+        :param local_names: names of the fields to query
+        :param priority: priority of the queries against other commands
+        :returns: list of fields whose query was not answered
+        """
+        # Map each expected answer prefix to its query deadline
+        pending = {}
+
+        for local_name in local_names:
+            prop = microphone_properties[local_name]
+
+            if prop.receive_command not in pending:
+                self._writer.write(
+                    prop.fetch_command,
+                    prop.fetch_command,
+                    priority,
+                )
+                pending[prop.receive_command] = (
+                    self._device.clock() + fetch_timeout
+                )
+
+        answered = set()
+
+        while pending and not self._stop_event.is_set():
+            # Drop expired queries
+            now = self._device.clock()
+            pending = {
+                key: deadline for key, deadline in pending.items()
+                if deadline > now
+            }
+
+            if pending:
+                timeout = min(pending.values()) - now
+                message = self._read_message(timeout)
+
+                if message:
+                    key = self._parse_message(message)
+
+                    if pending.pop(key, None) is not None:
+                        answered.add(key)
+
+        return [
+            local_name for local_name in local_names
+            if microphone_properties[local_name].receive_command
+            not in answered
+        ]
+
+    def _read_message(self, timeout=None, priorities=Priority):
+        """
+        Send the queued commands that are due, then wait for a message.
+
+        :param timeout: number of seconds to wait for a message, or None to
+            wait until a message arrives or a command is queued
+        :param priorities: classes of the commands that can be sent
+        :returns: message read from the device, or None if none was read
+        """
+        _queue_depth.observe(len(self._writer))
+        commands, next_due = self._writer.pop_due(priorities)
+        now = self._device.clock()
+
+        for priority, key, command in commands:
+            self._device.send_command(command)
+            self._sent_at[key] = now
+
+            if priority == Priority.User:
+                with self._state_lock:
+                    if key in self._intents:
+                        attempts = self._unconfirmed.get(key, (0, None))[0]
+                        self._unconfirmed[key] = (
+                            attempts + 1,
+                            now + fetch_timeout * 2 ** attempts,
+                        )
+
+        for wait in (next_due, self._check_writes()):
+            if wait is not None and (timeout is None or wait < timeout):
+                timeout = wait
+
+        return self._device.read_message(
+            timeout_ms=-1 if timeout is None else math.ceil(timeout * 1000)
+        )
+
+    def _check_writes(self):
+        """
+        Send unconfirmed changes again, or revert them after too many tries.
+
+        :returns: number of seconds until the next confirmation deadline, or
+            None if no change is waiting for confirmation
+        """
+        now = self._device.clock()
+        resent = []
+        reverted = []
+
+        with self._state_lock:
+            for key, (attempts, deadline) in list(self._unconfirmed.items()):
+                if deadline is None or deadline > now:
+                    continue
+
+                if attempts < max_write_attempts:
+                    resent.append((key, self._intents[key]))
+                    self._unconfirmed[key] = (attempts, None)
+                else:
+                    logger.warning(
+                        f"Device did not confirm “{self._intents[key]}”, "
+                        "reverting change"
+                    )
+                    del self._unconfirmed[key]
+                    del self._intents[key]
+                    reverted.extend(
+                        local_name
+                        for local_name, prop in microphone_properties.items()
+                        if prop.fetch_command == key
+                        and local_name in self._confirmed
+                    )
+
+            next_deadline = min(
+                (
+                    deadline for _, deadline in self._unconfirmed.values()
+                    if deadline is not None
+                ),
+                default=None,
+            )
+
+        for key, command in resent:
+            logger.debug(f"Resending unconfirmed “{command}”")
+            self._writer.write(key, command, Priority.User)
+
+        if reverted:
+            if "mode" in reverted:
+                self._switching_modes_sending.clear()
+
+                # Values meant for the mode that was not switched to
+                with self._state_lock:
+                    self._deferred_profile = None
+
+            self._publish({
+                local_name: self._confirmed[local_name]
+                for local_name in reverted
+            })
+
+            for local_name in reverted:
+                self._notify_on_main_thread(local_name)
+
+        return None if next_deadline is None else next_deadline - now
+
+    def _publish(self, changes, removed=()):
+        """
+        Replace the state snapshot with an updated one.
+
+        :param changes: mapping of property names to their new values
+        :param removed: names of the properties that are no longer known
+        """
+        with self._state_lock:
+            state = dict(self._state)
+
+            for local_name in removed:
+                state.pop(local_name, None)
+
+            state.update(changes)
+            self._state = MappingProxyType(state)
 
     def _parse_message(self, message):
-        """Read a message from the device and set property if appropriate."""
-        if "=" in message:
-            key, value = message.strip().split("=", maxsplit=1)
-        elif message.startswith("block ") and "Not valid" not in message:
-            key, value = message[6:].strip().split(" ", maxsplit=1)
+        """
+        Read a message from the device and set property if appropriate.
+
+        :returns: prefix of the message if it is a known answer, or None
+        """
+        start = time.perf_counter()
+        key = self._apply_message(message)
+        _parse_time.observe(time.perf_counter() - start)
+        return key
+
+    def _apply_message(self, message):
+        decoded = decode_message(message)
+
+        if decoded is None:
+            return None
+
+        key, values = decoded
+        prop = microphone_properties[values[0][0]]
+        self._confirmed.update(values)
+        sent_at = self._sent_at.pop(prop.fetch_command, None)
+
+        if sent_at is not None:
+            _round_trip.observe(self._device.clock() - sent_at)
+
+        with self._state_lock:
+            command = self._intents.get(prop.fetch_command)
+
+            if command is not None and all(
+                local_name in self._state
+                for local_name, _ in values
+            ):
+                # Compare the commands rather than the values, since the
+                # device may store a value differently than it was set
+                if prop.format_remote(dict(values)) != command:
+                    # Answer to an earlier command or query, the change
+                    # waiting for confirmation takes precedence
+                    return key
+
+                if self._unconfirmed.pop(prop.fetch_command, None):
+                    del self._intents[prop.fetch_command]
+
+        for local_name, next_value in values:
+            # Mode-specific fields change when the mode is switched by this
+            # instance or from another source
+            if local_name == "mode" and (
+                self._switching_modes_sending.is_set()
+                or next_value != self._state.get("mode")
+            ):
+                self._switching_modes_sending.clear()
+                self._switching_modes_fetching.set()
+                self._publish({}, mode_reset)
+
+                # Values and changes from the previous mode are obsolete
+                with self._state_lock:
+                    for reset_key in mode_reset:
+                        reset_prop = microphone_properties[reset_key]
+                        self._confirmed.pop(reset_key, None)
+                        self._intents.pop(reset_prop.fetch_command, None)
+                        self._unconfirmed.pop(reset_prop.fetch_command, None)
+
+            if (
+                local_name not in self._state
+                or next_value != self._state[local_name]
+            ):
+                self._publish({local_name: next_value})
+                self._notify_on_main_thread(local_name)
+
+        return key
+
+    def _notify_on_main_thread(self, prop_name):
+        """
+        Schedule a notification for a property changed by the I/O thread.
+
+        Changes are collected until the main loop is idle, then notified
+        together so that bindings and widgets are only updated once per
+        batch, even if a property changed several times.
+        """
+        with self._dirty_lock:
+            scheduled = bool(self._dirty)
+            self._dirty[prop_name] = None
+
+            if not scheduled:
+                self._dirty_since = time.monotonic()
+
+        if not scheduled:
+            GLib.idle_add(self._flush_notifications)
+
+    def _flush_notifications(self):
+        """Emit the notifications collected since the last flush."""
+        with self._dirty_lock:
+            prop_names, self._dirty = list(self._dirty), {}
+            _main_loop_delay.observe(time.monotonic() - self._dirty_since)
+
+        with self.freeze_notify():
+            for prop_name in prop_names:
+                self.notify(prop_name)
+
+        return False
+
+    def _set(self, local_name, value):
+        """
+        Change the value of a property and send it to the device.
+
+        :returns: True if the value was changed
+        """
+        prop = microphone_properties[local_name]
+        value = prop.parse_local(value)
+
+        with self._state_lock:
+            if value == self._state[local_name]:
+                return False
+
+            self._state = MappingProxyType({**self._state, local_name: value})
+            command = prop.format_remote(self._state)
+            self._intents[prop.fetch_command] = command
+
+            # A new change is sent as many times as the first one
+            self._unconfirmed.pop(prop.fetch_command, None)
+
+        self._write(prop.fetch_command, command)
+        return True
+
+    def _write(self, key, command):
+        """
+        Send a command changing a property or block of the device.
+
+        :param key: fetch command of the property changed by the command,
+            shared by properties stored in the same block
+        :param command: command to send
+        """
+        if self._batch is not None:
+            self._batch[key] = command
         else:
+            self._writer.write(key, command)
+
+    @contextlib.contextmanager
+    def batch(self):
+        """
+        Group property changes so that each command is sent only once.
+
+        Inside this context, changed properties are updated locally but their
+        commands are held back. On exit, a single command is sent for each
+        changed property or block, so that changing both filters for example
+        writes block 31 once.
+        """
+        if self._batch is not None:
+            # Nested batches are merged into the outermost one
+            yield self
             return
 
-        for local_name, prop in microphone_properties.items():
-            if key == prop.receive_command:
-                next_value = prop.parse_remote(value)
+        self._batch = {}
 
-                if local_name == "mode":
-                    for reset_key in mode_reset:
-                        self._switching_modes_sending.clear()
-                        self._switching_modes_fetching.set()
-                        self._state.pop(reset_key, None)
+        try:
+            yield self
+        finally:
+            batch, self._batch = self._batch, None
 
-                if (
-                    prop.local_name not in self._state
-                    or next_value != self._state[prop.local_name]
-                ):
-                    self._state[prop.local_name] = next_value
-                    self._notify_on_main_thread(prop.local_name)
+            for key, command in batch.items():
+                self._writer.write(key, command)
 
-    def _notify_on_main_thread(self, prop_name):
-        GLib.idle_add(lambda: self.notify(prop_name))
+    def apply_profile(self, profile):
+        """
+        Change several properties at once, sending as few commands as possible.
+
+        Only properties that differ from the current state are sent, and
+        properties sharing a block are sent together. If the profile switches
+        the DSP mode, the mode is sent first and mode-specific properties are
+        applied once the device has reported their values in the new mode.
+
+        :param profile: mapping of property names to values, such as
+            returned by :func:`mv7config.profile.load_profile`
+        :raises AttributeError: if the profile contains read-only properties
+        :raises RuntimeError: if the profile contains properties whose value
+            is not known yet, such as mode-specific properties while the
+            DSP mode is being switched
+        """
+        for local_name in profile:
+            if microphone_properties[local_name].format_remote is None:
+                raise AttributeError(f"Property {local_name} is read-only")
+
+        profile = dict(profile)
+        mode = profile.pop("mode", None)
+        switching = mode is not None and mode != self._state["mode"]
+        deferred = {}
+
+        if switching:
+            deferred = {
+                local_name: profile.pop(local_name)
+                for local_name in mode_reset
+                if local_name in profile
+            }
+
+        missing = [
+            local_name for local_name in profile
+            if local_name not in self._state
+        ]
+
+        if missing:
+            raise RuntimeError(
+                "Values not known yet: " + ", ".join(missing)
+            )
+
+        with self.batch():
+            if switching:
+                self.props.mode = mode
+
+                with self._state_lock:
+                    self._deferred_profile = (mode, deferred)
+
+            self._set_and_notify(profile)
+
+    def _apply_deferred_profile(self):
+        """
+        Apply mode-specific properties of a profile after a mode switch.
+
+        The properties are kept while a switch is still in progress, and
+        dropped if the device ended up in another mode than the one requested
+        by the profile.
+        """
+        current = self.props.mode
+
+        if current == Mode.Loading:
+            return False
+
+        with self._state_lock:
+            deferred, self._deferred_profile = self._deferred_profile, None
+
+        if deferred is not None and current == deferred[0]:
+            with self.batch():
+                self._set_and_notify(deferred[1])
+
+        return False
+
+    def _set_and_notify(self, values):
+        """Change properties from the main thread and notify changes."""
+        for local_name, value in values.items():
+            if self._set(local_name, value):
+                self.notify(local_name)
 
     def identify(self):
         """Ask the device to blink its LEDs."""
-        self._device.send_command("identify")
+        self._write("identify", "identify")
 
     def close(self):
         """Close connection to the device and background thread."""
         self._stop_event.set()
-        self._reader_thread.join()
+        self._device.wakeup()
+        self._io_thread.join()
         self._device.close()
 
+        if self._cache_key is not None and all(
+            local_name in self._state
+            for local_name in microphone_properties
+        ):
+            state_cache.save(self._cache_key, self._state)
+
     def __enter__(self):
         return self
 
@@ -377,9 +809,7 @@ class Microphone(GObject.Object):
 
     @lock.setter
     def lock(self, value):
-        if value != self._state["lock"]:
-            self._state["lock"] = value
-            self._device.send_command("lock on" if value else "lock off")
+        self._set("lock", value)
 
     @GObject.Property(type=bool, default=False)
     def monitor_mute(self):
@@ -387,9 +817,7 @@ class Microphone(GObject.Object):
 
     @monitor_mute.setter
     def monitor_mute(self, value):
-        if value != self._state["monitor_mute"]:
-            self._state["monitor_mute"] = value
-            self._device.send_command("audioMute on" if value else "audioMute off")
+        self._set("monitor_mute", value)
 
     @GObject.Property(type=int, default=0, minimum=-2400, maximum=0)
     def monitor_volume(self):
@@ -397,9 +825,7 @@ class Microphone(GObject.Object):
 
     @monitor_volume.setter
     def monitor_volume(self, value):
-        if value != self._state["monitor_volume"]:
-            self._state["monitor_volume"] = send_value = max(min(value, 0), -2400)
-            self._device.send_command(f"volume {send_value / 100:.2f}")
+        self._set("monitor_volume", value)
 
     @GObject.Property(type=int, default=0x20C5, minimum=0x20C5, maximum=0x4026E7)
     def monitor_mix_mic(self):
@@ -407,9 +833,7 @@ class Microphone(GObject.Object):
 
     @monitor_mix_mic.setter
     def monitor_mix_mic(self, value):
-        if value != self._state["monitor_mix_mic"]:
-            self._state["monitor_mix_mic"] = max(min(value, 0x4026E7), 0x20C5)
-            self._send_monitor_mix()
+        self._set("monitor_mix_mic", value)
 
     @GObject.Property(type=int, default=0x20C5, minimum=0x20C5, maximum=0x2026F3)
     def monitor_mix_pc(self):
@@ -417,14 +841,7 @@ class Microphone(GObject.Object):
 
     @monitor_mix_pc.setter
     def monitor_mix_pc(self, value):
-        if value != self._state["monitor_mix_pc"]:
-            self._state["monitor_mix_pc"] = max(min(value, 0x2026F3), 0x20C5)
-            self._send_monitor_mix()
-
-    def _send_monitor_mix(self):
-        msb = hex(self._state["monitor_mix_pc"])[2:].zfill(8).upper()
-        lsb = hex(self._state["monitor_mix_mic"])[2:].zfill(8).upper()
-        self._device.send_command(f"setBlock 22 {msb}{lsb}")
+        self._set("monitor_mix_pc", value)
 
     @GObject.Property
     def mode(self):
@@ -438,10 +855,13 @@ class Microphone(GObject.Object):
 
     @mode.setter
     def mode(self, value):
+        # Values deferred by a profile only apply to the switch it requested
+        with self._state_lock:
+            self._deferred_profile = None
+
         if value != self._state["mode"]:
-            self._state["mode"] = value
             self._switching_modes_sending.set()
-            self._device.send_command(f"dspMode {value.value}")
+            self._set("mode", value)
 
     @GObject.Property(type=bool, default=False)
     def input_mute(self):
@@ -449,9 +869,7 @@ class Microphone(GObject.Object):
 
     @input_mute.setter
     def input_mute(self, value):
-        if value != self._state["input_mute"]:
-            self._state["input_mute"] = value
-            self._device.send_command("micMute on" if value else "micMute off")
+        self._set("input_mute", value)
 
     @GObject.Property(type=int, default=0, minimum=0, maximum=3600)
     def input_volume(self):
@@ -459,17 +877,7 @@ class Microphone(GObject.Object):
 
     @input_volume.setter
     def input_volume(self, value):
-        if value != self._state["input_volume"]:
-            send_value = max(min(value, 3600), 0)
-            half_distance = send_value % 50
-
-            if 0 < half_distance < 25:
-                send_value -= half_distance
-            elif half_distance >= 25:
-                send_value += (50 - half_distance)
-
-            self._state["input_volume"] = send_value
-            self._device.send_command(f"inputGain {send_value / 100:.2f}")
+        self._set("input_volume", value)
 
     @GObject.Property
     def compressor(self):
@@ -477,10 +885,7 @@ class Microphone(GObject.Object):
 
     @compressor.setter
     def compressor(self, value):
-        if value != self._state["compressor"]:
-            self._state["compressor"] = value
-            send_value = str(value.value).zfill(8)
-            self._device.send_command(f"setBlock 19 {send_value}")
+        self._set("compressor", value)
 
     @GObject.Property(type=bool, default=False)
     def limiter(self):
@@ -488,10 +893,7 @@ class Microphone(GObject.Object):
 
     @limiter.setter
     def limiter(self, value):
-        if value != self._state["limiter"]:
-            self._state["limiter"] = value
-            send_value = "00000001" if value else "00000000"
-            self._device.send_command(f"setBlock 1F {send_value}")
+        self._set("limiter", value)
 
     @GObject.Property(type=bool, default=False)
     def high_pass_filter(self):
@@ -499,9 +901,7 @@ class Microphone(GObject.Object):
 
     @high_pass_filter.setter
     def high_pass_filter(self, value):
-        if value != self._state["high_pass_filter"]:
-            self._state["high_pass_filter"] = value
-            self._send_equalizer()
+        self._set("high_pass_filter", value)
 
     @GObject.Property(type=bool, default=False)
     def presence_filter(self):
@@ -509,21 +909,7 @@ class Microphone(GObject.Object):
 
     @presence_filter.setter
     def presence_filter(self, value):
-        if value != self._state["presence_filter"]:
-            self._state["presence_filter"] = value
-            self._send_equalizer()
-
-    def _send_equalizer(self):
-        send_value = 0
-
-        if self._state["high_pass_filter"]:
-            send_value |= 1
-
-        if self._state["presence_filter"]:
-            send_value |= 2
-
-        send_value = str(send_value).zfill(8)
-        self._device.send_command(f"setBlock 31 {send_value}")
+        self._set("presence_filter", value)
 
     @GObject.Property
     def auto_distance(self):
@@ -531,9 +917,7 @@ class Microphone(GObject.Object):
 
     @auto_distance.setter
     def auto_distance(self, value):
-        if value != self._state["auto_distance"]:
-            self._state["auto_distance"] = value
-            self._send_auto_level()
+        self._set("auto_distance", value)
 
     @GObject.Property
     def auto_tone(self):
@@ -541,21 +925,4 @@ class Microphone(GObject.Object):
 
     @auto_tone.setter
     def auto_tone(self, value):
-        if value != self._state["auto_tone"]:
-            self._state["auto_tone"] = value
-            self._send_auto_level()
-
-    def _send_auto_level(self):
-        if (
-            self._state["auto_distance"] == DistanceState.Off
-            or self._state["auto_tone"] == ToneState.Off
-        ):
-            send_value = 0
-        else:
-            send_value = (
-                self._state["auto_distance"].value
-                + self._state["auto_tone"].value
-            )
-
-        send_value = str(send_value).zfill(8)
-        self._device.send_command(f"setBlock 34 {send_value}")
+        self._set("auto_tone", value)
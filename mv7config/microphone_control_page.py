@@ -1,16 +1,13 @@
-import os
 import gi
 from gi.repository import Gtk, Handy, GObject
 from gi.repository.GObject import BindingFlags
 from .microphone import Microphone, Mode, CompressorState, DistanceState, ToneState
-from .utils import bind_toggles, bind_throttled
+from .utils import BindingGroup, bind_toggles, bind_throttled
 from .dual_scale import DualScale
+from . import resources
 
 
-dirname = os.path.dirname(__file__)
-
-
-@Gtk.Template(filename=os.path.join(dirname, "microphone_control_page.ui"))
+@Gtk.Template(**resources.template("microphone_control_page.ui"))
 class MicrophoneControlPage(Handy.PreferencesPage):
     __gtype_name__ = "MicrophoneControlPage"
 
@@ -52,9 +49,14 @@ class MicrophoneControlPage(Handy.PreferencesPage):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
+
+        # Bindings to the current microphone
+        self.bindings = BindingGroup()
+
         self.connect("notify::microphone", self.on_set_microphone)
 
     def on_set_microphone(self, x, y):
+        self.bindings.release()
         microphone = self.props.microphone
 
         if microphone is None:
@@ -63,26 +65,29 @@ class MicrophoneControlPage(Handy.PreferencesPage):
         bind_throttled(
             microphone, "monitor-volume",
             self.monitor_volume_adjustment, "value",
+            group=self.bindings,
         )
 
-        microphone.bind_property(
-            "monitor-mute", self.monitor_mute, "active",
+        self.bindings.bind_property(
+            microphone, "monitor-mute", self.monitor_mute, "active",
             BindingFlags.BIDIRECTIONAL | BindingFlags.SYNC_CREATE,
         )
 
-        self.monitor_mute.bind_property(
-            "active", self.monitor_volume, "sensitive",
+        self.bindings.bind_property(
+            self.monitor_mute, "active", self.monitor_volume, "sensitive",
             BindingFlags.INVERT_BOOLEAN | BindingFlags.SYNC_CREATE,
         )
 
         bind_throttled(
             microphone, "monitor-mix-mic",
             self.monitor_mix, "first-value",
+            group=self.bindings,
         )
 
         bind_throttled(
             microphone, "monitor-mix-pc",
             self.monitor_mix, "second-value",
+            group=self.bindings,
         )
 
         bind_toggles(
@@ -90,11 +95,12 @@ class MicrophoneControlPage(Handy.PreferencesPage):
             {
                 Mode.Manual: self.mode_manual,
                 Mode.Auto: self.mode_auto,
-            }
+            },
+            group=self.bindings,
         )
 
-        microphone.bind_property(
-            "mode", self.mode_stack_parent, "visible-child",
+        self.bindings.bind_property(
+            microphone, "mode", self.mode_stack_parent, "visible-child",
             BindingFlags.SYNC_CREATE,
             lambda _, value: getattr(self, f"mode_{value.name.lower()}_box"),
         )
@@ -102,20 +108,21 @@ class MicrophoneControlPage(Handy.PreferencesPage):
         bind_throttled(
             microphone, "input-volume",
             self.input_volume_adjustment, "value",
+            group=self.bindings,
         )
 
-        microphone.bind_property(
-            "input-mute", self.input_mute, "active",
+        self.bindings.bind_property(
+            microphone, "input-mute", self.input_mute, "active",
             BindingFlags.BIDIRECTIONAL | BindingFlags.SYNC_CREATE,
         )
 
-        microphone.bind_property(
-            "input-mute", self.input_mute_auto, "active",
+        self.bindings.bind_property(
+            microphone, "input-mute", self.input_mute_auto, "active",
             BindingFlags.BIDIRECTIONAL | BindingFlags.SYNC_CREATE,
         )
 
-        self.input_mute.bind_property(
-            "active", self.input_volume, "sensitive",
+        self.bindings.bind_property(
+            self.input_mute, "active", self.input_volume, "sensitive",
             BindingFlags.INVERT_BOOLEAN | BindingFlags.SYNC_CREATE,
         )
 
@@ -126,21 +133,22 @@ class MicrophoneControlPage(Handy.PreferencesPage):
                 CompressorState.Light: self.compressor_light,
                 CompressorState.Medium: self.compressor_medium,
                 CompressorState.Heavy: self.compressor_heavy,
-            }
+            },
+            group=self.bindings,
         )
 
-        microphone.bind_property(
-            "limiter", self.limiter, "active",
+        self.bindings.bind_property(
+            microphone, "limiter", self.limiter, "active",
             BindingFlags.BIDIRECTIONAL | BindingFlags.SYNC_CREATE,
         )
 
-        microphone.bind_property(
-            "high-pass-filter", self.high_pass_filter, "active",
+        self.bindings.bind_property(
+            microphone, "high-pass-filter", self.high_pass_filter, "active",
             BindingFlags.BIDIRECTIONAL | BindingFlags.SYNC_CREATE,
         )
 
-        microphone.bind_property(
-            "presence-filter", self.presence_filter, "active",
+        self.bindings.bind_property(
+            microphone, "presence-filter", self.presence_filter, "active",
             BindingFlags.BIDIRECTIONAL | BindingFlags.SYNC_CREATE,
         )
 
@@ -149,7 +157,8 @@ class MicrophoneControlPage(Handy.PreferencesPage):
             {
                 DistanceState.Close: self.distance_close,
                 DistanceState.Far: self.distance_far,
-            }
+            },
+            group=self.bindings,
         )
 
         bind_toggles(
@@ -158,5 +167,6 @@ class MicrophoneControlPage(Handy.PreferencesPage):
                 ToneState.Neutral: self.tone_neutral,
                 ToneState.Dark: self.tone_dark,
                 ToneState.Bright: self.tone_bright,
-            }
+            },
+            group=self.bindings,
         )
@@ -0,0 +1,168 @@
+import logging
+import os
+import threading
+from gi.repository import GLib, GObject
+from .microphone import Microphone
+
+
+logger = logging.getLogger(__name__)
+
+
+class MicrophoneManager(GObject.Object):
+    """
+    Open every available microphone and keep a registry of them.
+
+    Microphones are initialized concurrently, each on its own reader thread,
+    so that the time until all of them are ready stays close to the time
+    needed by a single one. Initialized microphones are indexed by their
+    serial number.
+    """
+    __gsignals__ = {
+        # Emitted when a microphone has been initialized and registered
+        "added": (GObject.SIGNAL_RUN_FIRST, None, (Microphone,)),
+
+        # Emitted when a registered microphone has been closed
+        "removed": (GObject.SIGNAL_RUN_FIRST, None, (Microphone,)),
+
+        # Emitted with the path of a device that could not be opened
+        "failed": (GObject.SIGNAL_RUN_FIRST, None, (str,)),
+    }
+
+    def __init__(
+        self,
+        enumerate=Microphone.enumerate,
+        factory=Microphone,
+        **microphone_args,
+    ):
+        """
+        Create an empty registry.
+
+        :param enumerate: function listing available devices, as a mapping
+            of their paths to their properties
+        :param factory: function opening a microphone from its path and
+            USB serial number
+        :param microphone_args: arguments passed to each microphone
+        """
+        super().__init__()
+        self._enumerate = enumerate
+        self._factory = factory
+        self._microphone_args = microphone_args
+
+        # Microphones being initialized or registered, by device path
+        self._by_path = {}
+
+        # Registered microphones, by serial number
+        self._by_serial = {}
+
+    @property
+    def microphones(self):
+        """Mapping of serial numbers to initialized microphones."""
+        return dict(self._by_serial)
+
+    @property
+    def pending(self):
+        """Number of microphones still being initialized."""
+        return len(self._by_path) - len(self._by_serial)
+
+    def get(self, serial_number):
+        """Get an initialized microphone by serial number, or None."""
+        return self._by_serial.get(serial_number)
+
+    def open_all(self):
+        """
+        Open all available microphones that are not open yet.
+
+        :returns: number of microphones open or being initialized
+        """
+        for path, info in self._enumerate().items():
+            self.open(path, info.get("serial_number") or None)
+
+        return len(self._by_path)
+
+    def scan(self, done=None):
+        """
+        Open all available microphones that are not open yet, listing them
+        on a worker thread so that the main loop is not blocked meanwhile.
+
+        :param done: function called on the main thread once all devices
+            found have been opened, with the number of microphones open or
+            being initialized
+        """
+        def finish(devices):
+            for path, info in devices.items():
+                self.open(path, info.get("serial_number") or None)
+
+            if done is not None:
+                done(len(self._by_path))
+
+            return False
+
+        threading.Thread(
+            target=lambda: GLib.idle_add(finish, self._enumerate()),
+            daemon=True,
+        ).start()
+
+    def open(self, path, serial_number=None):
+        """
+        Open a microphone and start its initialization.
+
+        :param path: path to the device
+        :param serial_number: USB serial number of the device, if known
+        """
+        if path in self._by_path:
+            return
+
+        try:
+            microphone = self._factory(
+                path,
+                serial_number=serial_number,
+                **self._microphone_args,
+            )
+        except OSError as err:
+            logger.error(f"Cannot open {os.fsdecode(path)}: {err}")
+            self.emit("failed", os.fsdecode(path))
+            return
+
+        microphone.connect("initialized", lambda _: self._on_initialized(path))
+        microphone.connect("failed", lambda *_: self._on_failed(path))
+        self._by_path[path] = microphone
+        microphone.initialize()
+
+    def close(self, path):
+        """
+        Close an open microphone.
+
+        :param path: path to the device
+        """
+        microphone = self._by_path.pop(path, None)
+
+        if microphone is None:
+            return
+
+        serial_number = microphone.props.serial_number
+        registered = self._by_serial.get(serial_number) is microphone
+
+        if registered:
+            del self._by_serial[serial_number]
+
+        microphone.close()
+
+        if registered:
+            self.emit("removed", microphone)
+
+    def close_all(self):
+        """Close all open microphones."""
+        for path in list(self._by_path):
+            self.close(path)
+
+    def _on_initialized(self, path):
+        microphone = self._by_path.get(path)
+
+        if microphone is not None:
+            self._by_serial[microphone.props.serial_number] = microphone
+            self.emit("added", microphone)
+
+    def _on_failed(self, path):
+        if path in self._by_path:
+            self.close(path)
+            self.emit("failed", os.fsdecode(path))
@@ -0,0 +1,94 @@
+import json
+from .protocol import (
+    Mode,
+    microphone_properties,
+    state_to_json,
+    state_from_json,
+)
+
+
+# Properties that can be stored in a profile
+profile_properties = [
+    local_name for local_name, prop in microphone_properties.items()
+    if prop.format_remote is not None
+]
+
+
+def profile_from_state(state):
+    """
+    Create a profile capturing the current settings of a device.
+
+    :param state: state dict of the device
+    :returns: mapping of property names to values
+    """
+    return {
+        local_name: state[local_name]
+        for local_name in profile_properties
+        if local_name in state
+    }
+
+
+def check_value(local_name, value):
+    """
+    Check that a value can be set to a property.
+
+    :param local_name: name of the property
+    :param value: value to check, with enumerations given as their members
+    :raises ValueError: if the value does not have the type of the property
+    """
+    prop = microphone_properties[local_name]
+    expected = prop.enum if prop.enum is not None else prop.value_type
+
+    # Exact types are compared since booleans are also integers, and the
+    # loading mode is only reported by the device while switching modes
+    if type(value) is not expected or value is Mode.Loading:
+        raise ValueError(f"Invalid value for {local_name}: {value!r}")
+
+
+def load_profile(path):
+    """
+    Read a profile from a JSON file.
+
+    Read-only properties, which are saved when dumping all properties, are
+    ignored.
+
+    :param path: path to the file
+    :returns: mapping of property names to values
+    :raises ValueError: if the file is not a valid profile
+    """
+    with open(path) as file:
+        data = json.load(file)
+
+    if not isinstance(data, dict):
+        raise ValueError("Profile must be a JSON object")
+
+    for local_name in data:
+        if local_name not in microphone_properties:
+            raise ValueError(f"Unknown property: {local_name}")
+
+    data = {
+        local_name: value for local_name, value in data.items()
+        if local_name in profile_properties
+    }
+
+    try:
+        profile = state_from_json(data)
+    except (KeyError, TypeError) as err:
+        raise ValueError(f"Invalid value in profile: {err}") from err
+
+    for local_name, value in profile.items():
+        check_value(local_name, value)
+
+    return profile
+
+
+def save_profile(profile, path):
+    """
+    Write a profile to a JSON file.
+
+    :param profile: mapping of property names to values
+    :param path: path to the file
+    """
+    with open(path, "w") as file:
+        json.dump(state_to_json(profile), file, indent=4)
+        file.write("\n")
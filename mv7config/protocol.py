@@ -0,0 +1,411 @@
+from typing import Any, Callable, Dict, Optional, Type
+from dataclasses import dataclass
+from enum import Enum
+
+
+# USB vendor ID for Shure products
+shure_vendor_id = 0x14ED
+
+# USB product ID for the MV7
+mv7_product_id = 0x1012
+
+# USB interface for the data HID communications
+mv7_data_interface = 3
+
+# Number of seconds to wait for the answer to a property query before
+# giving up on it and asking again
+fetch_timeout = .5
+
+# Number of seconds to wait for the device to log in and boot its DSP
+# before giving up on the connection
+handshake_timeout = 10
+
+# Phases of the communication handshake, with the command starting each
+# phase and the answer signaling that it has completed
+handshake_phases = {
+    # Set user to admin, otherwise some commands are not usable
+    "admin": ("su adm", "su=adm"),
+
+    # Boot the DSP
+    "dsp_boot": ("bootDSP C", "dspBooted"),
+}
+
+
+class Mode(Enum):
+    """Modes for the Shure MV7 DSP."""
+    # Currently switching between the two modes
+    Loading = 0
+
+    # Filters are tuned by the user
+    Manual = 1
+
+    # Filters are chosen based on a limited set of presets
+    Auto = 2
+
+
+class CompressorState(Enum):
+    """Settings for the compressor."""
+    Off = 0
+    Light = 1
+    Medium = 2
+    Heavy = 3
+
+
+class DistanceState(Enum):
+    """User distance to microphone in auto mode."""
+    Off = -1
+    Close = 1
+    Far = 4
+
+    def parse(value):
+        """Extract the distance component from the combined auto setting."""
+        if value >= DistanceState.Far.value:
+            return DistanceState.Far
+        elif value >= DistanceState.Close.value:
+            return DistanceState.Close
+        else:
+            return DistanceState.Off
+
+
+class ToneState(Enum):
+    """Tone in auto mode."""
+    Off = -1
+    Neutral = 0
+    Dark = 1
+    Bright = 2
+
+    def parse(value):
+        """Extract the tone component from the combined auto setting."""
+        if value >= DistanceState.Far.value:
+            return ToneState(value - DistanceState.Far.value)
+        elif value >= DistanceState.Close.value:
+            return ToneState(value - DistanceState.Close.value)
+        else:
+            return ToneState.Off
+
+
+@dataclass
+class MicrophoneProperty:
+    """Represents a property that can be read from the HID interface."""
+    # Name used in the Microphone class’s _state dict
+    local_name: str
+
+    # HID command used to query the current value of the property
+    fetch_command: str
+
+    # HID prefix signaling the answer to the property query
+    receive_command: str
+
+    # Filter for parsing the answer to the appropriate Python type (block
+    # payloads are passed as integers, other answers as strings)
+    parse_remote: Callable[[Any], Any]
+
+    # Enumeration of the possible values, if any
+    enum: Optional[Type[Enum]] = None
+
+    # Type of the values of the property, if it has no enumeration
+    value_type: Optional[type] = None
+
+    # Filter for bringing a locally set value in the range of the device
+    parse_local: Callable[[Any], Any] = lambda x: x
+
+    # Builds the command sending the property from the state dict, None if
+    # the property is read-only
+    format_remote: Optional[Callable[[Dict[str, Any]], str]] = None
+
+
+def _clamp(low, high):
+    """Make a filter that brings a value in a range."""
+    return lambda x: max(min(x, high), low)
+
+
+def _parse_input_volume(value):
+    """Round the input volume to the nearest half decibel."""
+    value = max(min(value, 3600), 0)
+    half_distance = value % 50
+
+    if 0 < half_distance < 25:
+        value -= half_distance
+    elif half_distance >= 25:
+        value += (50 - half_distance)
+
+    return value
+
+
+def _format_monitor_mix(state):
+    msb = hex(state["monitor_mix_pc"])[2:].zfill(8).upper()
+    lsb = hex(state["monitor_mix_mic"])[2:].zfill(8).upper()
+    return f"setBlock 22 {msb}{lsb}"
+
+
+def _format_equalizer(state):
+    send_value = 0
+
+    if state["high_pass_filter"]:
+        send_value |= 1
+
+    if state["presence_filter"]:
+        send_value |= 2
+
+    send_value = str(send_value).zfill(8)
+    return f"setBlock 31 {send_value}"
+
+
+def _format_auto_level(state):
+    if (
+        state["auto_distance"] == DistanceState.Off
+        or state["auto_tone"] == ToneState.Off
+    ):
+        send_value = 0
+    else:
+        send_value = state["auto_distance"].value + state["auto_tone"].value
+
+    send_value = str(send_value).zfill(8)
+    return f"setBlock 34 {send_value}"
+
+
+microphone_properties = {
+    prop.local_name: prop
+    for prop in [
+        MicrophoneProperty(
+            local_name="package_version",
+            fetch_command="pkgVersion",
+            receive_command="pkgVersion",
+            parse_remote=lambda x: x,
+            value_type=str,
+        ),
+        MicrophoneProperty(
+            local_name="firmware_version",
+            fetch_command="fwVersion",
+            receive_command="fwVersion",
+            parse_remote=lambda x: x,
+            value_type=str,
+        ),
+        MicrophoneProperty(
+            local_name="dsp_version",
+            fetch_command="dspVersion",
+            receive_command="dspVersion",
+            parse_remote=lambda x: x,
+            value_type=str,
+        ),
+        MicrophoneProperty(
+            local_name="serial_number",
+            fetch_command="serialNum",
+            receive_command="serialNum",
+            parse_remote=lambda x: x,
+            value_type=str,
+        ),
+        MicrophoneProperty(
+            local_name="lock",
+            fetch_command="lock",
+            receive_command="lock",
+            parse_remote=lambda x: x == "on",
+            value_type=bool,
+            format_remote=lambda s: "lock on" if s["lock"] else "lock off",
+        ),
+        MicrophoneProperty(
+            local_name="monitor_mute",
+            fetch_command="audioMute",
+            receive_command="audioMute",
+            parse_remote=lambda x: x == "on",
+            value_type=bool,
+            format_remote=lambda s: (
+                "audioMute on" if s["monitor_mute"] else "audioMute off"
+            ),
+        ),
+        MicrophoneProperty(
+            local_name="monitor_volume",
+            fetch_command="volume",
+            receive_command="volume",
+            parse_remote=lambda x: round(float(x[:-2]) * 100),
+            value_type=int,
+            parse_local=_clamp(-2400, 0),
+            format_remote=lambda s: f"volume {s['monitor_volume'] / 100:.2f}",
+        ),
+        MicrophoneProperty(
+            local_name="mode",
+            fetch_command="dspMode",
+            receive_command="dspMode",
+            parse_remote=lambda x: Mode.Manual if x == "1" else Mode.Auto,
+            enum=Mode,
+            format_remote=lambda s: f"dspMode {s['mode'].value}",
+        ),
+        MicrophoneProperty(
+            local_name="input_mute",
+            fetch_command="micMute",
+            receive_command="micMute",
+            parse_remote=lambda x: x == "on",
+            value_type=bool,
+            format_remote=lambda s: (
+                "micMute on" if s["input_mute"] else "micMute off"
+            ),
+        ),
+        MicrophoneProperty(
+            local_name="input_volume",
+            fetch_command="inputGain",
+            receive_command="inputGain",
+            parse_remote=lambda x: round(float(x[:-2]) * 100),
+            value_type=int,
+            parse_local=_parse_input_volume,
+            format_remote=lambda s: f"inputGain {s['input_volume'] / 100:.2f}",
+        ),
+        MicrophoneProperty(
+            local_name="monitor_mix_pc",
+            fetch_command="getBlock 22",
+            receive_command="22",
+            parse_remote=lambda x: x >> 32,
+            value_type=int,
+            parse_local=_clamp(0x20C5, 0x2026F3),
+            format_remote=_format_monitor_mix,
+        ),
+        MicrophoneProperty(
+            local_name="monitor_mix_mic",
+            fetch_command="getBlock 22",
+            receive_command="22",
+            parse_remote=lambda x: x & 0xFFFFFFFF,
+            value_type=int,
+            parse_local=_clamp(0x20C5, 0x4026E7),
+            format_remote=_format_monitor_mix,
+        ),
+        MicrophoneProperty(
+            local_name="compressor",
+            fetch_command="getBlock 19",
+            receive_command="19",
+            parse_remote=CompressorState,
+            enum=CompressorState,
+            format_remote=lambda s: (
+                f"setBlock 19 {str(s['compressor'].value).zfill(8)}"
+            ),
+        ),
+        MicrophoneProperty(
+            local_name="limiter",
+            fetch_command="getBlock 1F",
+            receive_command="1F",
+            parse_remote=lambda x: x == 1,
+            value_type=bool,
+            format_remote=lambda s: (
+                "setBlock 1F 00000001" if s["limiter"]
+                else "setBlock 1F 00000000"
+            ),
+        ),
+        MicrophoneProperty(
+            local_name="high_pass_filter",
+            fetch_command="getBlock 31",
+            receive_command="31",
+            parse_remote=lambda x: x & 1 != 0,
+            value_type=bool,
+            format_remote=_format_equalizer,
+        ),
+        MicrophoneProperty(
+            local_name="presence_filter",
+            fetch_command="getBlock 31",
+            receive_command="31",
+            parse_remote=lambda x: x & 2 != 0,
+            value_type=bool,
+            format_remote=_format_equalizer,
+        ),
+        MicrophoneProperty(
+            local_name="auto_distance",
+            fetch_command="getBlock 34",
+            receive_command="34",
+            parse_remote=DistanceState.parse,
+            enum=DistanceState,
+            format_remote=_format_auto_level,
+        ),
+        MicrophoneProperty(
+            local_name="auto_tone",
+            fetch_command="getBlock 34",
+            receive_command="34",
+            parse_remote=ToneState.parse,
+            enum=ToneState,
+            format_remote=_format_auto_level,
+        ),
+    ]
+}
+
+# List of properties that are changed when the DSP mode is switched
+# between auto and manual
+mode_reset = [
+    "input_volume",
+    "compressor",
+    "limiter",
+    "high_pass_filter",
+    "presence_filter",
+    "auto_distance",
+    "auto_tone",
+]
+
+# Properties that only change when the firmware is updated
+firmware_properties = [
+    "package_version",
+    "firmware_version",
+    "dsp_version",
+    "serial_number",
+]
+
+
+def state_to_json(state):
+    """Convert a state dict to a JSON-serializable dict."""
+    return {
+        local_name: value.name if isinstance(value, Enum) else value
+        for local_name, value in state.items()
+    }
+
+
+def state_from_json(data):
+    """
+    Convert a dict created by :func:`state_to_json` back to a state dict.
+
+    :raises KeyError: if a property or value is unknown
+    """
+    state = {}
+
+    for local_name, value in data.items():
+        prop = microphone_properties[local_name]
+        state[local_name] = prop.enum[value] if prop.enum else value
+
+    return state
+
+
+# Properties indexed by the prefix of the answers that carry them
+properties_by_answer = {}
+
+for prop in microphone_properties.values():
+    properties_by_answer.setdefault(prop.receive_command, []).append(prop)
+
+
+def decode_message(message):
+    """
+    Decode a message received from the device.
+
+    Answers either assign a value to a key (``key=value``) or dump the
+    payload of a block (``block <key> <hex payload>``). Block payloads are
+    converted to integers once and shared between all the properties that
+    they carry.
+
+    :param message: message read from the device
+    :returns: tuple of the message prefix and the list of (property name,
+        value) pairs that it carries, or None if not a known answer
+    """
+    key, is_assignment, value = message.strip().partition("=")
+
+    if not is_assignment:
+        parts = key.split(" ")
+
+        if len(parts) != 3 or parts[0] != "block":
+            return None
+
+        _, key, value = parts
+
+    props = properties_by_answer.get(key)
+
+    if props is None:
+        return None
+
+    if not is_assignment:
+        try:
+            value = int(value, 16)
+        except ValueError:
+            return None
+
+    return key, [(prop.local_name, prop.parse_remote(value)) for prop in props]
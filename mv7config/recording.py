@@ -0,0 +1,273 @@
+"""
+Record the reports exchanged with a device and replay them.
+
+Recordings are append-only binary files made of a header followed by
+fixed-size records, each holding the time at which a report was exchanged,
+its direction and its contents. Since records have a fixed size and are
+ordered by time, the file itself serves as a time index: any instant of a
+long recording can be found by binary search over a memory map of the file,
+without reading the records before it.
+"""
+import math
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+from .text_hid import TextHID, report_size
+from .simulator import VirtualClock
+
+
+# Identifies recording files and their format version
+magic = b"MV7REC\x00\x01"
+
+# File header, with the magic and the wall time at which recording started
+header_format = struct.Struct("<8sd")
+
+# Record of one report, with the number of seconds since recording started,
+# the direction of the report and its contents
+record_format = struct.Struct(f"<dB{report_size}s")
+
+# Directions of the recorded reports
+report_in = 0
+report_out = 1
+
+
+class Recorder:
+    """Append the reports exchanged with a device to a recording file."""
+    def __init__(self, path, clock=time.monotonic):
+        """
+        Start a new recording.
+
+        :param path: path to the file to create
+        :param clock: monotonic clock used to timestamp reports
+        """
+        self._file = open(path, "wb")
+        self._file.write(header_format.pack(magic, time.time()))
+        self._clock = clock
+        self._start = clock()
+
+    def incoming(self, report):
+        """Append a report received from the device."""
+        self._record(report_in, report)
+
+    def outgoing(self, report):
+        """Append a report sent to the device."""
+        self._record(report_out, report)
+
+    def _record(self, direction, report):
+        self._file.write(record_format.pack(
+            self._clock() - self._start,
+            direction,
+            bytes(report),
+        ))
+
+    def close(self):
+        self._file.close()
+
+
+class Recording:
+    """
+    Read a recording file without loading it.
+
+    Records are accessed by index, as (time, direction, report) tuples where
+    the report is cut at its first zero byte.
+    """
+    def __init__(self, path):
+        """
+        Open a recording.
+
+        :param path: path to the recording file
+        :raises ValueError: if the file is not a recording
+        """
+        with open(path, "rb") as file:
+            size = os.fstat(file.fileno()).st_size
+
+            if size < header_format.size:
+                raise ValueError(f"Not a recording: {path}")
+
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        file_magic, self.start_time = header_format.unpack_from(self._map)
+
+        if file_magic != magic:
+            self._map.close()
+            raise ValueError(f"Not a recording: {path}")
+
+        # Ignore a trailing partial record, left if recording was interrupted
+        self._count = (size - header_format.size) // record_format.size
+
+    def close(self):
+        self._map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index):
+        if not 0 <= index < self._count:
+            raise IndexError("Record index out of range")
+
+        timestamp, direction, report = record_format.unpack_from(
+            self._map,
+            header_format.size + index * record_format.size,
+        )
+        end = report.find(0)
+        return timestamp, direction, report if end == -1 else report[:end]
+
+    def time(self, index):
+        """Get the time of a record without decoding its report."""
+        return struct.unpack_from(
+            "<d",
+            self._map,
+            header_format.size + index * record_format.size,
+        )[0]
+
+    @property
+    def duration(self):
+        """Number of seconds between the start and the last record."""
+        return self.time(self._count - 1) if self._count else 0
+
+    def find(self, timestamp):
+        """Get the index of the first record at or after a given time."""
+        low, high = 0, self._count
+
+        while low < high:
+            middle = (low + high) // 2
+
+            if self.time(middle) < timestamp:
+                low = middle + 1
+            else:
+                high = middle
+
+        return low
+
+
+class ReplayDevice(TextHID):
+    """
+    Device feeding the reports received during a recording back to the
+    host, at their original pace or faster.
+
+    Incoming reports are made available at the time they were recorded,
+    scaled by the replay speed, regardless of the commands sent by the host,
+    which are collected in :attr:`received`. As with
+    :class:`mv7config.simulator.SimulatedDevice`, a
+    :class:`mv7config.simulator.VirtualClock` makes blocking reads return as
+    soon as the next report is due, for replays as fast as possible.
+    """
+    def __init__(
+        self,
+        recording,
+        speed=1,
+        start=0,
+        path=b"replay",
+        clock=time.monotonic,
+    ):
+        """
+        Prepare a replay.
+
+        :param recording: :class:`Recording` to replay
+        :param speed: factor by which the replay is faster than the recording
+        :param start: time in the recording from which to replay
+        :param path: name of the device used in logs
+        :param clock: clock used to pace the replay
+        """
+        self.clock = clock
+        self._recording = recording
+        self._speed = speed
+        self._origin = start
+
+        # Commands received from the host, in order
+        self.received = []
+
+        super().__init__(path)
+
+    def _open(self):
+        self._condition = threading.Condition()
+        self._next = self._recording.find(self._origin)
+        self._started = self.clock()
+        self._woken = False
+
+    def _close(self):
+        pass
+
+    def wakeup(self):
+        with self._condition:
+            self._woken = True
+            self._condition.notify_all()
+
+    def _write_raw(self, report):
+        end = report.find(0)
+        command = bytes(report[:end] if end != -1 else report)
+
+        with self._condition:
+            self.received.append(command.decode("latin-1"))
+
+    def _due(self):
+        """Get the next incoming report and the time when it is due."""
+        while self._next < len(self._recording):
+            timestamp, direction, report = self._recording[self._next]
+
+            if direction == report_in:
+                due = self._started + (timestamp - self._origin) / self._speed
+                return due, report
+
+            self._next += 1
+
+        return math.inf, None
+
+    def _read_raw(self, timeout_ms):
+        with self._condition:
+            now = self.clock()
+            deadline = math.inf if timeout_ms < 0 else now + timeout_ms / 1000
+
+            while not self._woken:
+                now = self.clock()
+                due, report = self._due()
+
+                if due <= now:
+                    self._next += 1
+                    return report.ljust(report_size, b"\0")
+
+                wake_at = min(due, deadline)
+
+                if wake_at <= now:
+                    return None
+
+                if isinstance(self.clock, VirtualClock) and wake_at < math.inf:
+                    self.clock.advance(wake_at - now)
+                else:
+                    self._condition.wait(
+                        None if wake_at == math.inf else wake_at - now
+                    )
+
+            self._woken = False
+            return None
+
+
+def main():
+    """Print the reports of a recording, one per line."""
+    if len(sys.argv) != 2:
+        print(f"Usage: {sys.argv[0]} RECORDING", file=sys.stderr)
+        sys.exit(1)
+
+    directions = {report_in: " IN", report_out: "OUT"}
+
+    with Recording(sys.argv[1]) as recording:
+        for index in range(len(recording)):
+            timestamp, direction, report = recording[index]
+            print(
+                f"{timestamp:12.6f}",
+                directions.get(direction, "???"),
+                report.decode("latin-1").strip(),
+            )
+
+
+if __name__ == "__main__":
+    main()
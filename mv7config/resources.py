@@ -0,0 +1,84 @@
+import functools
+import logging
+import os
+import subprocess
+import sys
+from gi.repository import Gio, GLib
+
+
+logger = logging.getLogger(__name__)
+
+dirname = os.path.dirname(__file__)
+
+# Description of the files bundled as resources
+resource_description = os.path.join(dirname, "mv7config.gresource.xml")
+
+# Compiled resource bundle, built from the description when installing with
+# “python -m mv7config.resources”
+resource_bundle = os.path.join(dirname, "mv7config.gresource")
+
+# Path under which bundled files are registered
+resource_prefix = "/re/delab/mv7config"
+
+
+def compile_bundle():
+    """
+    Build the resource bundle from its description.
+
+    :raises OSError: if glib-compile-resources is not available
+    :raises subprocess.CalledProcessError: if the build fails
+    """
+    subprocess.run(
+        [
+            "glib-compile-resources",
+            f"--sourcedir={dirname}",
+            f"--target={resource_bundle}",
+            resource_description,
+        ],
+        check=True,
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def register():
+    """
+    Make bundled files available to GIO, if the bundle was built.
+
+    The bundle is never built at runtime, so that starting the application
+    does not depend on the resource compiler nor on a writable package
+    directory.
+
+    :returns: whether the bundle could be registered
+    """
+    if not os.path.exists(resource_bundle):
+        return False
+
+    try:
+        Gio.resources_register(Gio.Resource.load(resource_bundle))
+        return True
+    except GLib.Error as err:
+        logger.warning(f"Cannot load resource bundle: {err}")
+        return False
+
+
+def template(name):
+    """
+    Get the arguments for :class:`Gtk.Template` to load a UI file, from the
+    resource bundle if it is available or else from the source directory.
+
+    :param name: name of the UI file
+    """
+    if register():
+        return {"resource_path": f"{resource_prefix}/{name}"}
+
+    return {"filename": os.path.join(dirname, name)}
+
+
+if __name__ == "__main__":
+    # Build the bundle when installing, it must be built again after
+    # changing any of the bundled files
+    try:
+        compile_bundle()
+    except (OSError, subprocess.CalledProcessError) as err:
+        print(f"Cannot build resource bundle: {err}", file=sys.stderr)
+        sys.exit(1)
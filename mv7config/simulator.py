@@ -0,0 +1,224 @@
+import heapq
+import itertools
+import math
+import random
+import threading
+from .text_hid import TextHID, report_size
+
+
+class VirtualClock:
+    """
+    Monotonic clock that only advances when a simulated device waits.
+
+    Instances are called like :func:`time.monotonic`. Waiting for a reply
+    from a :class:`SimulatedDevice` using this clock jumps directly to the
+    time at which the reply is due, so that protocol exchanges run in
+    virtual time.
+    """
+    def __init__(self, start=0.0):
+        self._now = start
+
+    def __call__(self):
+        return self._now
+
+    def advance(self, seconds):
+        """Move the clock forward by a number of seconds."""
+        self._now += max(seconds, 0)
+
+
+# Values answered by a simulated device for its global settings
+default_values = {
+    "pkgVersion": "1.2.1.0",
+    "fwVersion": "1.2.1",
+    "dspVersion": "1.0.7",
+    "serialNum": "MV7SIM000001",
+    "lock": "off",
+    "audioMute": "off",
+    "volume": "-12.00dB",
+    "dspMode": "1",
+    "micMute": "off",
+    "22": "002026F3004026E7",
+}
+
+# Values answered by a simulated device for its settings specific to each
+# DSP mode, which change when switching modes
+default_mode_values = {
+    # Manual mode
+    "1": {
+        "inputGain": "18.00dB",
+        "19": "00000001",
+        "1F": "00000001",
+        "31": "00000001",
+        "34": "00000000",
+    },
+
+    # Auto mode
+    "2": {
+        "inputGain": "24.00dB",
+        "19": "00000000",
+        "1F": "00000001",
+        "31": "00000000",
+        "34": "00000005",
+    },
+}
+
+# Settings that can be read but not changed
+read_only_values = {"pkgVersion", "fwVersion", "dspVersion", "serialNum"}
+
+# Settings expressed in decibels
+gain_values = {"volume", "inputGain"}
+
+
+class SimulatedDevice(TextHID):
+    """
+    In-process stand-in for an MV7 microphone.
+
+    Implements the :class:`mv7config.text_hid.TextHID` interface and answers
+    commands the way a real device does, after a configurable latency. This
+    includes the login and DSP boot handshake, getters and setters for each
+    setting and block, and DSP mode switches, which swap the mode-specific
+    settings. Replies can be dropped at random, from a fixed seed, to
+    exercise retry paths deterministically.
+
+    With the default :class:`VirtualClock`, blocking reads return as soon as
+    the next reply is due in virtual time. Callers that only poll without
+    waiting, such as :class:`mv7config.async_microphone.AsyncMicrophone`,
+    need a real clock like :func:`time.monotonic` instead.
+    """
+    def __init__(
+        self,
+        path=b"simulated",
+        latency=.002,
+        boot_latency=.05,
+        drop_rate=0,
+        seed=0,
+        clock=None,
+    ):
+        """
+        Create a simulated device.
+
+        :param path: name of the device used in logs
+        :param latency: number of seconds before each reply is available
+        :param boot_latency: number of seconds needed to boot the DSP
+        :param drop_rate: probability for each reply to be lost
+        :param seed: seed of the random generator used to drop replies
+        :param clock: clock used to schedule replies, a new
+            :class:`VirtualClock` by default
+        """
+        self.clock = clock if clock is not None else VirtualClock()
+        self.latency = latency
+        self.boot_latency = boot_latency
+        self.drop_rate = drop_rate
+        self._random = random.Random(seed)
+
+        # Commands received from the host, in order
+        self.received = []
+
+        self.values = dict(default_values)
+        self.mode_values = {
+            mode: dict(values)
+            for mode, values in default_mode_values.items()
+        }
+
+        super().__init__(path)
+
+    def _open(self):
+        self._condition = threading.Condition()
+        self._replies = []
+        self._sequence = itertools.count()
+        self._woken = False
+
+    def _close(self):
+        pass
+
+    def wakeup(self):
+        with self._condition:
+            self._woken = True
+            self._condition.notify_all()
+
+    def _write_raw(self, report):
+        end = report.find(0)
+        command = bytes(report[:end] if end != -1 else report)
+        command = command.decode("latin-1")
+
+        with self._condition:
+            self.received.append(command)
+            self._handle(command.strip())
+            self._condition.notify_all()
+
+    def _read_raw(self, timeout_ms):
+        with self._condition:
+            now = self.clock()
+            deadline = math.inf if timeout_ms < 0 else now + timeout_ms / 1000
+
+            while not self._woken:
+                now = self.clock()
+
+                if self._replies and self._replies[0][0] <= now:
+                    return heapq.heappop(self._replies)[2]
+
+                wake_at = min(
+                    self._replies[0][0] if self._replies else math.inf,
+                    deadline,
+                )
+
+                if wake_at <= now:
+                    return None
+
+                if isinstance(self.clock, VirtualClock) and wake_at < math.inf:
+                    self.clock.advance(wake_at - now)
+                else:
+                    self._condition.wait(
+                        None if wake_at == math.inf else wake_at - now
+                    )
+
+            self._woken = False
+            return None
+
+    def _reply(self, message, delay=None):
+        """Schedule a reply to be read after the device latency."""
+        if self._random.random() < self.drop_rate:
+            return
+
+        due = self.clock() + (self.latency if delay is None else delay)
+        report = (message + "\n").encode("latin-1")[:report_size]
+        report += bytes(report_size - len(report))
+        heapq.heappush(self._replies, (due, next(self._sequence), report))
+
+    def _settings(self, key):
+        """Get the dictionary holding a setting in the current mode."""
+        mode_values = self.mode_values[self.values["dspMode"]]
+        return mode_values if key in mode_values else self.values
+
+    def _handle(self, command):
+        name, _, argument = command.partition(" ")
+
+        if command == "su adm":
+            self._reply("su=adm")
+        elif command == "bootDSP C":
+            self._reply("dspBooted", self.boot_latency)
+        elif name in ("getBlock", "setBlock"):
+            block, _, payload = argument.partition(" ")
+            settings = self._settings(block)
+
+            if block not in settings:
+                self._reply(f"block {block} Not valid")
+                return
+
+            if name == "setBlock" and payload:
+                settings[block] = payload.upper().zfill(len(settings[block]))
+
+            self._reply(f"block {block} {settings[block]}")
+        elif name == "dspMode":
+            if argument in self.mode_values:
+                self.values["dspMode"] = argument
+
+            self._reply(f"dspMode={self.values['dspMode']}")
+        elif name in (settings := self._settings(name)):
+            if argument and name not in read_only_values:
+                if name in gain_values:
+                    settings[name] = f"{float(argument):.2f}dB"
+                else:
+                    settings[name] = argument
+
+            self._reply(f"{name}={settings[name]}")
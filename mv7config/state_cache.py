@@ -0,0 +1,55 @@
+import json
+import logging
+import os
+from .protocol import state_to_json, state_from_json
+
+
+logger = logging.getLogger(__name__)
+
+
+def cache_dir():
+    """Get the directory where device states are saved."""
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(base, "mv7config")
+
+
+def _cache_path(serial_number):
+    return os.path.join(cache_dir(), f"{serial_number}.json")
+
+
+def load(serial_number):
+    """
+    Load the last saved state of a device.
+
+    :param serial_number: USB serial number of the device
+    :returns: saved state dict, or None if there is no usable saved state
+    """
+    try:
+        with open(_cache_path(serial_number)) as file:
+            return state_from_json(json.load(file))
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, KeyError) as err:
+        logger.warning(f"Ignoring saved state for {serial_number}: {err}")
+        return None
+
+
+def save(serial_number, state):
+    """
+    Save the state of a device, replacing any previously saved state.
+
+    :param serial_number: USB serial number of the device
+    :param state: state dict
+    """
+    path = _cache_path(serial_number)
+    temp_path = path + ".tmp"
+
+    try:
+        os.makedirs(cache_dir(), exist_ok=True)
+
+        with open(temp_path, "w") as file:
+            json.dump(state_to_json(state), file, indent=4)
+
+        os.replace(temp_path, path)
+    except OSError as err:
+        logger.warning(f"Could not save state: {err}")
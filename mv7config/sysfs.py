@@ -0,0 +1,114 @@
+import os
+from .protocol import shure_vendor_id, mv7_product_id, mv7_data_interface
+
+
+# Mount point of the sysfs filesystem
+sysfs_root = "/sys"
+
+# Last enumeration results, reused while the set of hidraw devices stays the
+# same, as a pair of the device entries and the results of each query
+_enumeration_cache = (None, None)
+
+
+def hid_device_info(path):
+    """
+    Read the identity of the HID device behind a hidraw device.
+
+    :param path: path to the hidraw device directory in sysfs
+    :returns: dict with the same keys as :func:`hid.enumerate` entries, or
+        None if the device is not an USB HID device
+    """
+    try:
+        with open(os.path.join(path, "device", "uevent")) as file:
+            uevent = dict(
+                line.rstrip("\n").split("=", maxsplit=1)
+                for line in file
+                if "=" in line
+            )
+
+        bus, vendor_id, product_id = uevent["HID_ID"].split(":")
+        _, _, interface = uevent["HID_PHYS"].rpartition("/input")
+
+        return {
+            "path": os.fsencode(
+                os.path.join("/dev", os.path.basename(os.path.normpath(path)))
+            ),
+            "vendor_id": int(vendor_id, 16),
+            "product_id": int(product_id, 16),
+            "interface_number": int(interface),
+            "serial_number": uevent.get("HID_UNIQ", ""),
+            "product_string": uevent.get("HID_NAME", ""),
+            "bus_type": int(bus, 16),
+        }
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def microphone_info(path):
+    """
+    Read the identity of a hidraw device if it is the data interface of an
+    MV7.
+
+    :param path: path to the hidraw device directory in sysfs
+    :returns: same dict as :func:`hid_device_info`, or None if the device is
+        not an MV7 data interface
+    """
+    info = hid_device_info(path)
+
+    if info is not None and (
+        info["vendor_id"] == shure_vendor_id
+        and info["product_id"] == mv7_product_id
+        and info["interface_number"] == mv7_data_interface
+    ):
+        return info
+
+    return None
+
+
+def enumerate_hidraw(vendor_id, product_id, interface_number):
+    """
+    List hidraw devices exposing a given USB interface, keyed by path.
+
+    Devices are matched from their sysfs attributes without being opened.
+    The result is reused until a hidraw device is added or removed.
+
+    :returns: same mapping as :func:`mv7config.text_hid.enumerate_paths`, or
+        None if hidraw devices are not listed in sysfs
+    """
+    global _enumeration_cache
+    class_dir = os.path.join(sysfs_root, "class", "hidraw")
+
+    try:
+        # Recreated entries get a new inode number, so that a device plugged
+        # in under the name of a removed one is not mistaken for it
+        with os.scandir(class_dir) as entries:
+            listing = frozenset(
+                (entry.name, entry.inode()) for entry in entries
+            )
+    except OSError:
+        return None
+
+    cached_listing, cached_result = _enumeration_cache
+    query = (vendor_id, product_id, interface_number)
+
+    if cached_listing == listing and query in cached_result:
+        return dict(cached_result[query])
+
+    if cached_listing != listing:
+        cached_result = {}
+
+    devices = {}
+
+    for name, _ in listing:
+        info = hid_device_info(os.path.join(class_dir, name))
+
+        if info is not None and (
+            info["vendor_id"] == vendor_id
+            and info["product_id"] == product_id
+            and info["interface_number"] == interface_number
+        ):
+            devices[info["path"]] = info
+
+    cached_result[query] = devices
+    _enumeration_cache = (listing, cached_result)
+    return dict(devices)
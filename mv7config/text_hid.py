@@ -1,41 +1,315 @@
+import functools
+import os
+import queue
+import selectors
+import threading
+import time
 import hid
 import logging
+from . import sysfs
+from .metrics import registry
 
 
 logger = logging.getLogger(__name__)
 
+# Size in bytes of the HID reports exchanged with the device
+report_size = 64
+
+# Longest interval in milliseconds during which the hidapi reader thread
+# does not notice that the device was closed
+hidapi_wakeup_interval = 200
+
+# Traffic with all devices
+_reports_out = registry.counter(
+    "mv7config_reports_out_total", "Reports sent to devices",
+)
+_reports_in = registry.counter(
+    "mv7config_reports_in_total", "Reports received from devices",
+)
+_bytes_out = registry.counter(
+    "mv7config_bytes_out_total", "Bytes sent to devices",
+)
+_bytes_in = registry.counter(
+    "mv7config_bytes_in_total", "Bytes received from devices",
+)
+
+# Padding used to fill the end of outgoing reports
+_zeros = memoryview(bytes(report_size))
+
+
+@functools.lru_cache(maxsize=128)
+def _encode_prefix(prefix):
+    """Encode the constant part of a command, such as “setBlock 22 ”."""
+    return prefix.encode("latin-1")
+
+
+def enumerate_paths(vendor_id, product_id, interface_number):
+    """
+    List HID devices exposing a given USB interface, keyed by path.
+
+    On Linux, devices are found from sysfs without a full hidapi scan.
+    """
+    devices = sysfs.enumerate_hidraw(vendor_id, product_id, interface_number)
+
+    if devices is not None:
+        return devices
+
+    return {
+        match["path"]: match
+        for match in hid.enumerate(vendor_id, product_id)
+        if match["interface_number"] == interface_number
+    }
+
+
+def open_device(path):
+    """
+    Open a device with the most efficient backend available for it.
+
+    If the :envvar:`MV7CONFIG_RECORD_DIR` environment variable is set, the
+    reports exchanged with the device are recorded to a new file in that
+    directory, see :mod:`mv7config.recording`.
+    """
+    if os.fsdecode(path).startswith("/dev/hidraw"):
+        device = HidrawTextHID(path)
+    else:
+        device = TextHID(path)
+
+    record_dir = os.environ.get("MV7CONFIG_RECORD_DIR")
+
+    if record_dir:
+        name = os.path.basename(os.fsdecode(path)) or "device"
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        try:
+            device.start_recording(
+                os.path.join(record_dir, f"{name}-{stamp}.mv7rec")
+            )
+        except OSError as err:
+            logger.error(f"Cannot record {os.fsdecode(path)}: {err}")
+
+    return device
+
 
 class TextHID:
+    """
+    Exchange text commands with a HID device through hidapi.
+
+    Since hidapi reads cannot be interrupted, they are made by a reader
+    thread that queues the received reports, and :meth:`wakeup` interrupts
+    a wait on this queue immediately.
+    """
+    # Clock against which read timeouts are measured
+    clock = staticmethod(time.monotonic)
+
+    # Recorder receiving the exchanged reports, if recording
+    _recorder = None
+
     def __init__(self, path):
         self._path = path
+        self._name = os.fsdecode(path)
+
+        # Outgoing report, reused for each command
+        self._report = bytearray(report_size)
+        self._report_view = memoryview(self._report)
+
+        self._open()
+
+    def _open(self):
         self._hid = hid.device()
-        self._hid.open_path(path)
+        self._hid.open_path(self._path)
+        self._hid.set_nonblocking(True)
+        self._reports = queue.SimpleQueue()
+        self._closing = threading.Event()
+        self._reader = threading.Thread(
+            target=self._reader_run,
+            name=f"Reader {self._name}",
+            daemon=True,
+        )
+        self._reader.start()
+
+    def _reader_run(self):
+        """Queue the reports received from the device until it is closed."""
+        while not self._closing.is_set():
+            try:
+                data = self._hid.read(report_size, hidapi_wakeup_interval)
+            except OSError as err:
+                # Report the error to the next read
+                self._reports.put(err)
+                return
+
+            if data:
+                self._reports.put(bytes(data))
 
     def close(self):
+        self.stop_recording()
+        self._close()
+
+    def _close(self):
+        self._closing.set()
+        self._reader.join()
         self._hid.close()
 
+    def start_recording(self, path):
+        """
+        Record all reports exchanged with the device from now on.
+
+        :param path: path to the recording file to create
+        """
+        from .recording import Recorder
+
+        self.stop_recording()
+        self._recorder = Recorder(path, self.clock)
+        logger.info(f"Recording {self._name} to {path}")
+
+    def stop_recording(self):
+        """Stop recording reports and close the recording file."""
+        if self._recorder is not None:
+            self._recorder.close()
+            self._recorder = None
+
+    def wakeup(self):
+        """Interrupt a read waiting for a report in another thread."""
+        self._reports.put(None)
+
     def __enter__(self):
         return self
 
     def __exit__(self, exc_type, exc_value, traceback):
         self.close()
 
+    def write_report(self, *parts):
+        """
+        Send a report made of the concatenation of byte strings.
+
+        The report is truncated or padded with zeros to the report size.
+        """
+        view = self._report_view
+        end = 0
+
+        for part in parts:
+            size = min(len(part), report_size - end)
+            view[end:end + size] = part[:size]
+            end += size
+
+        view[end:] = _zeros[end:]
+        self._write_raw(self._report)
+        _reports_out.inc()
+        _bytes_out.inc(report_size)
+
+        if self._recorder is not None:
+            self._recorder.outgoing(self._report)
+
+    def _write_raw(self, report):
+        self._hid.write(report)
+
+    def read_report(self, timeout_ms=0):
+        """
+        Read a report from the device.
+
+        :param timeout_ms: number of milliseconds to wait for a report,
+            zero to return immediately or negative to wait indefinitely
+        :returns: report contents up to the first zero byte, or None if no
+            report was received before the timeout or a wakeup
+        """
+        report = self._read_raw(timeout_ms)
+
+        if not report:
+            return None
+
+        _reports_in.inc()
+        _bytes_in.inc(len(report))
+
+        if self._recorder is not None:
+            self._recorder.incoming(report)
+
+        end = report.find(0)
+        return report if end == -1 else report[:end]
+
+    def _read_raw(self, timeout_ms):
+        try:
+            report = self._reports.get(
+                timeout_ms != 0,
+                None if timeout_ms < 0 else timeout_ms / 1000,
+            )
+        except queue.Empty:
+            return None
+
+        if isinstance(report, OSError):
+            raise report
+
+        return report
+
     def send_command(self, data):
-        logger.debug(f"(OUT {self._path.decode()}) {data.strip()}")
-        command = [ord(char) for char in data[:64]]
-        self._hid.write(command + [0] * (64 - len(command)))
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("(OUT %s) %s", self._name, data.strip())
+
+        # Cache the encoded command name and constant arguments, which are
+        # repeated across calls, and only encode the last argument
+        prefix, space, argument = data.rpartition(" ")
+        self.write_report(
+            _encode_prefix(prefix + space),
+            argument.encode("latin-1"),
+        )
 
     def read_message(self, timeout_ms=0):
-        data = self._hid.read(max_length=64, timeout_ms=timeout_ms)
+        report = self.read_report(timeout_ms)
 
-        if not data:
+        if report is None:
             return None
 
-        try:
-            end = data.index(0)
-        except ValueError:
-            end = len(data)
+        message = report.decode("latin-1")
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("( IN %s) %s", self._name, message.strip())
 
-        message = "".join(chr(code) for code in data[:end])
-        logger.debug(f"( IN {self._path.decode()}) {message.strip()}")
         return message
+
+
+class HidrawTextHID(TextHID):
+    """
+    Exchange text commands with a HID device through its Linux hidraw node.
+
+    Reads wait on the device file descriptor, so that an idle device causes
+    no wakeups, and :meth:`wakeup` interrupts them immediately through a
+    pipe. The descriptor is exposed by :meth:`fileno` for use in event loops.
+    """
+    def _open(self):
+        self._fd = os.open(self._path, os.O_RDWR | os.O_NONBLOCK)
+        self._wakeup_read, self._wakeup_write = os.pipe2(os.O_NONBLOCK)
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(self._fd, selectors.EVENT_READ)
+        self._selector.register(self._wakeup_read, selectors.EVENT_READ)
+
+    def _close(self):
+        self._selector.close()
+        os.close(self._wakeup_read)
+        os.close(self._wakeup_write)
+        os.close(self._fd)
+
+    def fileno(self):
+        return self._fd
+
+    def wakeup(self):
+        try:
+            os.write(self._wakeup_write, b"\0")
+        except BlockingIOError:
+            # Pipe is full, a wakeup is already pending
+            pass
+
+    def _write_raw(self, report):
+        os.write(self._fd, report)
+
+    def _read_raw(self, timeout_ms):
+        if timeout_ms != 0:
+            events = self._selector.select(
+                None if timeout_ms < 0 else timeout_ms / 1000
+            )
+
+            for key, _ in events:
+                if key.fd == self._wakeup_read:
+                    os.read(self._wakeup_read, 4096)
+                    return None
+
+        try:
+            return os.read(self._fd, report_size)
+        except BlockingIOError:
+            return None
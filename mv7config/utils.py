@@ -1,8 +1,174 @@
+import heapq
+import math
 import time
 from gi.repository import GLib
 
 
-def bind_toggles(source, source_prop, targets):
+class ThrottleScheduler:
+    """
+    Run callbacks at given deadlines from the GLib main loop, sharing a
+    single timer between all of them.
+
+    Deadlines are measured on a monotonic clock and rounded up to ticks of
+    a fixed resolution. Callbacks due on the same tick share a slot of a
+    timer wheel, and only the earliest slot has a GLib timeout. Moving a
+    deadline later does not touch the timeout, which is only moved when
+    it fires, so that rescheduling on every change of a property is cheap.
+    """
+    def __init__(self, resolution=.01, clock=time.monotonic):
+        """
+        Create a scheduler.
+
+        :param resolution: number of seconds between two ticks
+        :param clock: monotonic clock on which deadlines are measured
+        """
+        self.clock = clock
+        self._resolution = resolution
+
+        # Callbacks by key in each slot, indexed by tick
+        self._slots = {}
+
+        # Tick of the slot holding each key
+        self._ticks = {}
+
+        # Ticks of the slots, in a heap which may contain emptied slots
+        self._heap = []
+
+        # Tick and source ID of the active GLib timeout
+        self._timer = None
+
+    def __len__(self):
+        """Number of callbacks waiting to run."""
+        return len(self._ticks)
+
+    def schedule(self, key, deadline, callback):
+        """
+        Run a callback at a deadline, replacing any callback scheduled with
+        the same key.
+
+        :param key: hashable identifier of the callback
+        :param deadline: time on the scheduler clock at which to run it
+        :param callback: function to call without arguments
+        """
+        self.cancel(key)
+        tick = math.ceil(deadline / self._resolution)
+        slot = self._slots.get(tick)
+
+        if slot is None:
+            slot = self._slots[tick] = {}
+            heapq.heappush(self._heap, tick)
+
+        slot[key] = callback
+        self._ticks[key] = tick
+        self._arm()
+
+    def cancel(self, key):
+        """Cancel the callback scheduled with a given key, if any."""
+        tick = self._ticks.pop(key, None)
+
+        if tick is not None:
+            slot = self._slots[tick]
+            del slot[key]
+
+            if not slot:
+                del self._slots[tick]
+
+    def _arm(self):
+        """Make sure that a timeout fires no later than the earliest slot."""
+        while self._heap and self._heap[0] not in self._slots:
+            heapq.heappop(self._heap)
+
+        if not self._heap:
+            return
+
+        tick = self._heap[0]
+
+        if self._timer is not None:
+            if self._timer[0] <= tick:
+                return
+
+            GLib.source_remove(self._timer[1])
+
+        delay = max(tick * self._resolution - self.clock(), 0)
+        self._timer = (
+            tick,
+            GLib.timeout_add(math.ceil(delay * 1000), self._on_timeout),
+        )
+
+    def _on_timeout(self):
+        self._timer = None
+        now = self.clock()
+        callbacks = []
+
+        while self._heap and self._heap[0] * self._resolution <= now:
+            slot = self._slots.pop(heapq.heappop(self._heap), {})
+
+            for key, callback in slot.items():
+                del self._ticks[key]
+                callbacks.append(callback)
+
+        for callback in callbacks:
+            callback()
+
+        self._arm()
+        return False
+
+
+# Scheduler shared by all throttled bindings
+throttle_scheduler = ThrottleScheduler()
+
+
+class BindingGroup:
+    """
+    Own the bindings and signal handlers made between objects, so that
+    they can all be released at once.
+
+    Handlers keep the objects that they reference alive and keep running
+    as long as they are connected, so bindings made to an object that is
+    replaced must be released along with it.
+    """
+    def __init__(self):
+        self._bindings = []
+        self._handlers = []
+        self._cleanups = []
+
+    def __len__(self):
+        """Number of bindings and handlers held."""
+        return len(self._bindings) + len(self._handlers)
+
+    def bind_property(self, source, source_prop, target, target_prop, *args):
+        """Bind two properties, see :meth:`GObject.Object.bind_property`."""
+        binding = source.bind_property(source_prop, target, target_prop, *args)
+        self._bindings.append(binding)
+        return binding
+
+    def connect(self, obj, signal, callback):
+        """Connect a signal handler, see :meth:`GObject.Object.connect`."""
+        handler = obj.connect(signal, callback)
+        self._handlers.append((obj, handler))
+        return handler
+
+    def add_cleanup(self, callback):
+        """Register a function to call when the group is released."""
+        self._cleanups.append(callback)
+
+    def release(self):
+        """Remove all bindings and handlers of the group."""
+        for binding in self._bindings:
+            binding.unbind()
+
+        for obj, handler in self._handlers:
+            obj.disconnect(handler)
+
+        for callback in self._cleanups:
+            callback()
+
+        self._bindings.clear()
+        self._handlers.clear()
+        self._cleanups.clear()
+
+
+def bind_toggles(source, source_prop, targets, group=None):
     """
     Make a two-way binding between a set of toggles and an enumeration.
 
@@ -10,7 +176,9 @@ def bind_toggles(source, source_prop, targets):
     :param source_prop: name of the property in :param:`source` that
         holds the enumeration value
     :param targets: mapping from enumeration values to the set of toggles
+    :param group: :class:`BindingGroup` owning the binding, if any
     """
+    group = group if group is not None else BindingGroup()
     values = {target: value for value, target in targets.items()}
 
     def on_source_changed():
@@ -36,16 +204,29 @@ def bind_toggles(source, source_prop, targets):
                 source.set_property(source_prop, next_value)
 
     for target in targets.values():
-        target.connect("toggled", on_target_changed)
+        group.connect(target, "toggled", on_target_changed)
 
     on_source_changed()
-    source.connect("notify::" + source_prop, lambda x, y: on_source_changed())
+    group.connect(
+        source,
+        "notify::" + source_prop,
+        lambda x, y: on_source_changed(),
+    )
 
 
-def bind_throttled(source, source_prop, target, target_prop, timeout=1):
+def bind_throttled(
+    source, source_prop, target, target_prop,
+    timeout=1,
+    interval=.05,
+    leading=True,
+    trailing=True,
+    scheduler=throttle_scheduler,
+    group=None,
+):
     """
     Make a two-way binding between two properties such that updates from
-    the source are ignored while the target is being modified.
+    the source are ignored while the target is being modified, and updates
+    from the target are sent to the source at a limited rate.
 
     :param source: source object to bind
     :param source_prop: name of the property of the source object to bind
@@ -53,21 +234,31 @@ def bind_throttled(source, source_prop, target, target_prop, timeout=1):
     :param target_prop: name of the property of the target object to bind
     :param timeout: number of seconds to wait after each change to the
         target property before accepting changes from the source property
+    :param interval: minimum number of seconds between two updates of the
+        source property from the target property
+    :param leading: whether to update the source immediately on the first
+        change of the target after a quiet interval
+    :param trailing: whether to update the source with the last value of
+        the target at the end of each interval in which it changed
+    :param scheduler: scheduler running the delayed updates
+    :param group: :class:`BindingGroup` owning the binding, if any
     """
-    last_target_change = 0
-    active_timeout = None
+    group = group if group is not None else BindingGroup()
+    last_target_change = -math.inf
+    last_push = -math.inf
+    push_scheduled = False
 
-    def on_source_changed():
-        nonlocal active_timeout
-        since_last_change = time.time() - last_target_change
+    # Keys of the delayed updates of this binding in the scheduler
+    source_key = object()
+    push_key = object()
 
-        if active_timeout is not None:
-            GLib.source_remove(active_timeout)
-            active_timeout = None
+    def on_source_changed():
+        since_last_change = scheduler.clock() - last_target_change
 
         if since_last_change < timeout:
-            active_timeout = GLib.timeout_add(
-                round((timeout - since_last_change) * 1000),
+            scheduler.schedule(
+                source_key,
+                last_target_change + timeout,
                 on_source_changed,
             )
         else:
@@ -76,25 +267,56 @@ def bind_throttled(source, source_prop, target, target_prop, timeout=1):
             if target.get_property(target_prop) != next_value:
                 target.set_property(target_prop, next_value)
 
-    def on_target_changed():
-        nonlocal last_target_change
+    def push():
+        nonlocal last_push, push_scheduled
+        push_scheduled = False
         next_value = target.get_property(target_prop)
 
         if source.get_property(source_prop) != next_value:
-            last_target_change = time.time()
+            last_push = scheduler.clock()
             source.set_property(source_prop, next_value)
 
+    def on_target_changed():
+        nonlocal last_target_change, push_scheduled
+        next_value = target.get_property(target_prop)
+
+        if source.get_property(source_prop) == next_value:
+            return
+
+        now = scheduler.clock()
+        last_target_change = now
+
+        if push_scheduled:
+            # Pending update will send the latest value
+            return
+
+        if leading and now - last_push >= interval:
+            push()
+        elif trailing:
+            push_scheduled = True
+            scheduler.schedule(
+                push_key,
+                (last_push if leading else now) + interval,
+                push,
+            )
+
     target.set_property(
         target_prop,
         source.get_property(source_prop),
     )
 
-    source.connect(
+    group.connect(
+        source,
         "notify::" + source_prop,
         lambda x, y: on_source_changed()
     )
 
-    target.connect(
+    group.connect(
+        target,
         "notify::" + target_prop,
         lambda x, y: on_target_changed()
     )
+
+    # Drop pending updates, which reference both objects
+    group.add_cleanup(lambda: scheduler.cancel(source_key))
+    group.add_cleanup(lambda: scheduler.cancel(push_key))
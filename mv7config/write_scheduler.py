@@ -0,0 +1,138 @@
+import math
+import threading
+import time
+from enum import IntEnum
+
+
+class Priority(IntEnum):
+    """Classes of commands, from the most to the least urgent."""
+    # Changes requested by the user
+    User = 0
+
+    # Queries needed to know the state of the device
+    Sync = 1
+
+    # Background checks of values that are already known
+    Diagnostics = 2
+
+
+class WriteScheduler:
+    """Queue commands for the thread that owns a device, by priority."""
+    def __init__(
+        self,
+        max_rate=20,
+        clock=time.monotonic,
+        wakeup=None,
+        max_total_rate=math.inf,
+        max_burst=math.inf,
+    ):
+        """
+        Create a write scheduler.
+
+        :param max_rate: maximum number of commands sent per second and
+            per key
+        :param clock: clock against which intervals are measured
+        :param wakeup: function called when a command is queued, to
+            interrupt the owner thread if it is waiting
+        :param max_total_rate: maximum number of commands sent per second
+            in total, on average
+        :param max_burst: maximum number of commands sent at once after
+            an idle period
+        """
+        self._interval = 1 / max_rate
+        self._clock = clock
+        self._wakeup = wakeup
+        self._pending = {priority: {} for priority in Priority}
+        self._last_sent = {}
+        self._lock = threading.Lock()
+
+        # Token bucket limiting the total rate
+        self._token_rate = max_total_rate
+        self._max_tokens = max_burst
+        self._tokens = max_burst
+        self._last_refill = clock()
+
+    def write(self, key, command, priority=Priority.User):
+        """
+        Queue a command, replacing any command queued for the same key
+        and priority.
+
+        :param key: name of the property or block concerned by the command
+        :param command: command to send
+        :param priority: class of the command
+        """
+        with self._lock:
+            self._pending[priority][key] = command
+
+        if self._wakeup is not None:
+            self._wakeup()
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(pending) for pending in self._pending.values())
+
+    def depth(self):
+        """Get the number of queued commands in each priority class."""
+        with self._lock:
+            return {
+                priority: len(pending)
+                for priority, pending in self._pending.items()
+            }
+
+    def pop_due(self, priorities=Priority):
+        """
+        Take the queued commands that can be sent now.
+
+        :param priorities: classes from which to take commands, others are
+            kept queued
+        :returns: list of (priority, key, command) tuples to send, in order,
+            and number of seconds until the next remaining command is due
+            or None if none remains
+        """
+        with self._lock:
+            now = self._clock()
+            elapsed = now - self._last_refill
+
+            if elapsed > 0:
+                self._tokens = min(
+                    self._max_tokens,
+                    self._tokens + elapsed * self._token_rate,
+                )
+                self._last_refill = now
+
+            commands = []
+            next_due = math.inf
+
+            for priority in priorities:
+                pending = self._pending[priority]
+
+                for key in list(pending):
+                    wait = (
+                        self._last_sent.get((priority, key), -math.inf)
+                        + self._interval - now
+                    )
+
+                    if wait > 0:
+                        next_due = min(next_due, wait)
+                    elif self._tokens >= 1:
+                        self._tokens -= 1
+                        self._last_sent[(priority, key)] = now
+                        commands.append((priority, key, pending.pop(key)))
+                    else:
+                        next_due = min(
+                            next_due,
+                            (1 - self._tokens) / self._token_rate,
+                        )
+
+            return commands, None if next_due == math.inf else next_due
+
+    def drain(self):
+        """Take all queued commands, whether they are due or not."""
+        with self._lock:
+            commands = []
+
+            for pending in self._pending.values():
+                commands.extend(pending.values())
+                pending.clear()
+
+            return commands
@@ -1,9 +1,10 @@
 #!/usr/bin/env python3
+import os
 import sys
 import readline
 import threading
-from mv7config.text_hid import TextHID
-from mv7config.microphone import Microphone
+from mv7config.text_hid import open_device
+from mv7config.cli import list_devices
 
 
 prompt = "> "
@@ -17,7 +18,7 @@ class ReaderThread(threading.Thread):
 
     def run(self):
         while not self._stop_event.is_set():
-            message = self._device.read_message(timeout_ms=200)
+            message = self._device.read_message(timeout_ms=-1)
 
             if message:
                 print(
@@ -28,17 +29,30 @@ class ReaderThread(threading.Thread):
 
     def stop(self):
         self._stop_event.set()
+        self._device.wakeup()
         self.join()
 
 
 def main():
-    available_devices = Microphone.enumerate()
+    available_devices = list_devices()
 
     if not available_devices:
         print("No MV7 microphone found")
         sys.exit(1)
 
-    with TextHID(next(iter(available_devices))) as device:
+    if len(sys.argv) > 1:
+        path = os.fsencode(sys.argv[1])
+    elif len(available_devices) > 1:
+        print("Several MV7 microphones found, choose one of:")
+
+        for path in available_devices:
+            print(os.fsdecode(path))
+
+        sys.exit(1)
+    else:
+        path = next(iter(available_devices))
+
+    with open_device(path) as device:
         thread = ReaderThread(device)
         thread.start()
 
@@ -0,0 +1,64 @@
+import time
+import weakref
+import pytest
+
+
+# Maximum number of seconds to wait for a microphone in each test
+wait_timeout = 10
+
+
+@pytest.fixture
+def run_main_loop():
+    """Run the GLib main loop until a predicate holds."""
+    from gi.repository import GLib
+
+    def run(done):
+        context = GLib.MainContext.default()
+        deadline = time.monotonic() + wait_timeout
+
+        while not done():
+            if time.monotonic() > deadline:
+                raise TimeoutError("Condition not reached in time")
+
+            context.iteration(False)
+            time.sleep(.001)
+
+    return run
+
+
+@pytest.fixture
+def open_microphone():
+    """
+    Open microphones on simulated devices, which are closed at the end of
+    the test.
+    """
+    from mv7config.microphone import Microphone
+
+    # Microphones are kept alive by their I/O thread until closed, so that
+    # tests can check that closed microphones are freed
+    microphones = weakref.WeakSet()
+
+    def open(device, **kwargs):
+        kwargs.setdefault("use_cache", False)
+        microphone = Microphone(device=device, **kwargs)
+        microphones.add(microphone)
+        return microphone
+
+    yield open
+
+    for microphone in list(microphones):
+        microphone.close()
+
+
+@pytest.fixture
+def start_microphone(open_microphone, run_main_loop):
+    """Open and initialize microphones on simulated devices."""
+    def start(device, **kwargs):
+        initialized = []
+        microphone = open_microphone(device, **kwargs)
+        microphone.connect("initialized", lambda _: initialized.append(True))
+        microphone.initialize()
+        run_main_loop(lambda: initialized)
+        return microphone
+
+    return start
@@ -0,0 +1,110 @@
+import asyncio
+import time
+import pytest
+from mv7config import async_microphone
+from mv7config.async_microphone import AsyncMicrophone
+from mv7config.protocol import Mode
+from mv7config.simulator import SimulatedDevice
+
+
+def run(test):
+    """Run a coroutine function against a microphone on a simulated device."""
+    async def main():
+        device = SimulatedDevice(clock=time.monotonic)
+        microphone = AsyncMicrophone(device=device)
+
+        try:
+            await test(microphone, device)
+        finally:
+            await microphone.close()
+
+    asyncio.run(main())
+
+
+def test_connect():
+    async def test(microphone, device):
+        await microphone.connect()
+        assert microphone.state["serial_number"] == "MV7SIM000001"
+        assert microphone.state["monitor_volume"] == -1200
+        assert set(microphone.handshake_durations) == {"admin", "dsp_boot"}
+
+    run(test)
+
+
+def test_get_fetches_on_demand():
+    async def test(microphone, device):
+        await microphone.connect(fetch=False)
+        assert "input_volume" not in microphone.state
+
+        assert await microphone.get("input_volume") == 1800
+        assert device.received.count("inputGain") == 1
+
+        # Known values are not asked again
+        assert await microphone.get("input_volume") == 1800
+        assert device.received.count("inputGain") == 1
+
+    run(test)
+
+
+def test_set():
+    async def test(microphone, device):
+        await microphone.connect()
+        await microphone.set("monitor_volume", -600)
+
+        # Unchanged values are not sent
+        await microphone.set("monitor_mute", False)
+
+        assert device.received[-1] == "volume -6.00"
+        assert device.values["volume"] == "-6.00dB"
+        assert microphone.state["monitor_volume"] == -600
+
+    run(test)
+
+
+def test_mode_switch():
+    async def test(microphone, device):
+        await microphone.connect()
+        await microphone.apply_profile({
+            "mode": Mode.Auto,
+            "input_volume": 3000,
+        })
+
+        assert device.values["dspMode"] == "2"
+        assert device.mode_values["2"]["inputGain"] == "30.00dB"
+        assert await microphone.get("mode") == Mode.Auto
+        assert await microphone.get("input_volume") == 3000
+
+    run(test)
+
+
+def test_changes():
+    async def test(microphone, device):
+        await microphone.connect()
+        changes = microphone.changes()
+        change = asyncio.ensure_future(changes.__anext__())
+
+        # Let the iterator subscribe
+        await asyncio.sleep(0)
+        await microphone.set("input_mute", True)
+
+        assert await change == ("input_mute", True)
+        await changes.aclose()
+
+    run(test)
+
+
+def test_unanswered_query(monkeypatch):
+    monkeypatch.setattr(async_microphone, "fetch_timeout", .01)
+
+    async def test(microphone, device):
+        # Blocks missing from the device are answered as not valid
+        del device.mode_values["1"]["19"]
+
+        with pytest.raises(asyncio.TimeoutError):
+            await microphone.connect()
+
+        assert device.received.count("getBlock 19") == (
+            async_microphone.max_fetch_attempts
+        )
+
+    run(test)
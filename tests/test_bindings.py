@@ -0,0 +1,230 @@
+import gc
+import sys
+import tracemalloc
+import weakref
+import pytest
+
+gi = pytest.importorskip("gi")
+
+from gi.repository import GLib, GObject
+from gi.repository.GObject import BindingFlags
+from mv7config.microphone import Mode
+from mv7config.simulator import SimulatedDevice
+from mv7config.utils import (
+    BindingGroup,
+    bind_throttled,
+    bind_toggles,
+    throttle_scheduler,
+)
+
+
+# Number of times a microphone is bound again in each test
+reconnects = 1000
+
+
+class Control(GObject.Object):
+    """Stand-in for a widget or an adjustment holding a value."""
+    value = GObject.Property(type=float, minimum=-1e9, maximum=1e9)
+    active = GObject.Property(type=bool, default=False)
+    sensitive = GObject.Property(type=bool, default=True)
+
+
+class Toggle(Control):
+    """Stand-in for a toggle button."""
+    __gsignals__ = {
+        "toggled": (GObject.SignalFlags.RUN_FIRST, None, ()),
+    }
+
+    def set_active(self, active):
+        self.props.active = active
+        self.emit("toggled")
+
+    def set_sensitive(self, sensitive):
+        self.props.sensitive = sensitive
+
+
+def count_handlers(obj):
+    """Count the signal handlers connected to an object."""
+    match = GObject.SignalMatchType.ID | GObject.SignalMatchType.UNBLOCKED
+    signal_ids = []
+    gtype = type(obj).__gtype__
+
+    while gtype != GObject.TYPE_INVALID:
+        signal_ids.extend(GObject.signal_list_ids(gtype))
+        gtype = gtype.parent
+
+    # Block each handler once found so that the next search skips it
+    blocked = []
+
+    for signal_id in signal_ids:
+        while handler := GObject.signal_handler_find(
+            obj, match, signal_id, 0, None, None, None,
+        ):
+            GObject.signal_handler_block(obj, handler)
+            blocked.append(handler)
+
+    for handler in blocked:
+        GObject.signal_handler_unblock(obj, handler)
+
+    return len(blocked)
+
+
+def make_controls():
+    """Create stand-ins for the controls bound by the control page."""
+    return {
+        "monitor_volume": Control(),
+        "monitor_mute": Control(),
+        "mode_manual": Toggle(),
+        "mode_auto": Toggle(),
+        "input_volume": Control(),
+    }
+
+
+def bind_controls(group, microphone, controls):
+    """Bind a microphone to a set of controls, like the control page."""
+    bind_throttled(
+        microphone, "monitor-volume",
+        controls["monitor_volume"], "value",
+        group=group,
+    )
+    group.bind_property(
+        microphone, "monitor-mute", controls["monitor_mute"], "active",
+        BindingFlags.BIDIRECTIONAL | BindingFlags.SYNC_CREATE,
+    )
+    bind_toggles(
+        microphone, "mode",
+        {Mode.Manual: controls["mode_manual"], Mode.Auto: controls["mode_auto"]},
+        group=group,
+    )
+    bind_throttled(
+        microphone, "input-volume",
+        controls["input_volume"], "value",
+        group=group,
+    )
+
+
+def test_rebind_keeps_handlers_constant(start_microphone):
+    microphones = [start_microphone(SimulatedDevice()) for _ in range(2)]
+    controls = make_controls()
+    watched = microphones + list(controls.values())
+    baseline = [count_handlers(obj) for obj in watched]
+    group = BindingGroup()
+    counts = []
+
+    for reconnect in range(reconnects):
+        group.release()
+        bind_controls(group, microphones[reconnect % 2], controls)
+
+        # Trigger throttled updates, whose timers must be released too
+        controls["monitor_volume"].props.value = -reconnect
+        counts.append((
+            len(group),
+            tuple(count_handlers(obj) for obj in watched),
+        ))
+
+    # Handlers only depend on which microphone is bound
+    assert len(set(counts[0::2])) == 1
+    assert len(set(counts[1::2])) == 1
+
+    group.release()
+    assert len(group) == 0
+    assert len(throttle_scheduler) == 0
+    assert [count_handlers(obj) for obj in watched] == baseline
+
+
+def test_rebind_keeps_memory_flat(start_microphone):
+    microphones = [start_microphone(SimulatedDevice()) for _ in range(2)]
+    controls = make_controls()
+    group = BindingGroup()
+
+    def rebind(times):
+        for reconnect in range(times):
+            group.release()
+            bind_controls(group, microphones[reconnect % 2], controls)
+
+    tracemalloc.start()
+
+    try:
+        # Let the caches of PyGObject settle
+        rebind(reconnects)
+        gc.collect()
+        before, _ = tracemalloc.get_traced_memory()
+        rebind(reconnects)
+        gc.collect()
+        after, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    group.release()
+
+    # Less than what any object left behind by each reconnection would take
+    assert after - before < reconnects * 64
+
+
+def test_rebind_frees_replaced_microphones(start_microphone):
+    controls = make_controls()
+    baseline = [count_handlers(control) for control in controls.values()]
+    group = BindingGroup()
+    replaced = []
+    microphone = None
+
+    for reconnect in range(50):
+        group.release()
+
+        if microphone is not None:
+            microphone.close()
+
+        microphone = start_microphone(SimulatedDevice())
+        replaced.append(weakref.ref(microphone))
+        bind_controls(group, microphone, controls)
+
+    group.release()
+    microphone.close()
+    del microphone
+
+    # Drop the notifications still scheduled by the closed microphones
+    context = GLib.MainContext.default()
+
+    while context.pending():
+        context.iteration(False)
+
+    gc.collect()
+
+    assert [ref() for ref in replaced] == [None] * len(replaced)
+    assert [count_handlers(control) for control in controls.values()] == (
+        baseline
+    )
+    assert len(throttle_scheduler) == 0
+
+
+def test_control_page_rebind(start_microphone):
+    try:
+        gi.require_version("Gtk", "3.0")
+        gi.require_version("Handy", "1")
+        from gi.repository import Gtk
+    except (ValueError, ImportError):
+        pytest.skip("GTK is not available")
+
+    if not Gtk.init_check(sys.argv)[0]:
+        pytest.skip("No display available")
+
+    from mv7config.microphone_control_page import MicrophoneControlPage
+
+    microphones = [start_microphone(SimulatedDevice()) for _ in range(2)]
+    baseline = [count_handlers(microphone) for microphone in microphones]
+    page = MicrophoneControlPage()
+    counts = []
+
+    for reconnect in range(reconnects):
+        page.props.microphone = microphones[reconnect % 2]
+        counts.append((
+            len(page.bindings),
+            tuple(count_handlers(microphone) for microphone in microphones),
+        ))
+
+    assert len(set(counts[0::2])) == 1
+    assert len(set(counts[1::2])) == 1
+
+    page.props.microphone = None
+    assert len(page.bindings) == 0
+    assert [count_handlers(m) for m in microphones] == baseline
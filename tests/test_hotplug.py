@@ -0,0 +1,98 @@
+import errno
+import os
+import pytest
+
+pytest.importorskip("gi")
+
+from mv7config.hotplug import DeviceMonitor, ManualEventSource
+from mv7config.microphone import Microphone
+from mv7config.microphone_manager import MicrophoneManager
+from mv7config.simulator import SimulatedDevice
+
+
+class UnpluggableDevice(SimulatedDevice):
+    """Simulated device that fails like a real one once unplugged."""
+    def __init__(self):
+        super().__init__()
+        self.plugged = True
+
+    def unplug(self):
+        self.plugged = False
+        self.wakeup()
+
+    def _check_plugged(self):
+        if not self.plugged:
+            raise OSError(errno.ENODEV, os.strerror(errno.ENODEV))
+
+    def _write_raw(self, report):
+        self._check_plugged()
+        super()._write_raw(report)
+
+    def _read_raw(self, timeout_ms):
+        self._check_plugged()
+        report = super()._read_raw(timeout_ms)
+        self._check_plugged()
+        return report
+
+
+@pytest.fixture
+def monitor():
+    """
+    Monitor simulated devices plugged in and unplugged through a manual
+    event source, recording the signals of the manager.
+    """
+    devices = {}
+    events = []
+
+    def factory(path, serial_number=None):
+        return Microphone(
+            device=devices[path],
+            use_cache=False,
+            serial_number=serial_number,
+        )
+
+    manager = MicrophoneManager(enumerate=dict, factory=factory)
+
+    for signal in ("added", "removed", "failed"):
+        manager.connect(
+            signal,
+            lambda _, value, signal=signal: events.append((signal, value)),
+        )
+
+    source = ManualEventSource()
+    monitor = DeviceMonitor(manager, source)
+    monitor.start()
+    yield manager, source, devices, events
+    monitor.stop()
+    manager.close_all()
+
+
+def test_plug_and_unplug(monitor, run_main_loop):
+    manager, source, devices, events = monitor
+    devices[b"mic0"] = UnpluggableDevice()
+    source.push("add", b"mic0", "MV7SIM000001")
+    run_main_loop(lambda: events)
+
+    microphone = manager.get("MV7SIM000001")
+    assert events == [("added", microphone)]
+
+    source.push("remove", b"mic0")
+    run_main_loop(lambda: len(events) == 2)
+
+    assert events[1] == ("removed", microphone)
+    assert manager.microphones == {}
+
+
+def test_unplug_without_event(monitor, run_main_loop):
+    manager, source, devices, events = monitor
+    devices[b"mic0"] = UnpluggableDevice()
+    source.push("add", b"mic0", "MV7SIM000001")
+    run_main_loop(lambda: events)
+    microphone = manager.get("MV7SIM000001")
+
+    # Removing a device is noticed even if no event is received
+    devices[b"mic0"].unplug()
+    run_main_loop(lambda: len(events) == 3)
+
+    assert events[1:] == [("removed", microphone), ("failed", "mic0")]
+    assert manager.microphones == {}
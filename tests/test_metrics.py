@@ -0,0 +1,62 @@
+import json
+from mv7config.metrics import Registry
+
+
+def make_registry():
+    registry = Registry()
+    registry.counter("reports_total", "Reports", direction="in").inc(3)
+    registry.counter("reports_total", "Reports", direction="out").inc()
+    registry.gauge("open_devices", "Open devices").set(2)
+    latency = registry.histogram("latency_seconds", "Latency", (.1, 1))
+
+    for value in (.05, .5, .5, 3):
+        latency.observe(value)
+
+    return registry
+
+
+def test_same_metric_returned():
+    registry = Registry()
+    counter = registry.counter("reports_total", "Reports", direction="in")
+    assert registry.counter("reports_total", "Reports", direction="in") is (
+        counter
+    )
+    assert registry.counter("reports_total", "Reports") is not counter
+
+
+def test_snapshot():
+    snapshot = make_registry().snapshot()
+    assert json.loads(json.dumps(snapshot)) == {
+        "latency_seconds": [{
+            "labels": {},
+            "value": {
+                "buckets": {"0.1": 1, "1": 2, "+Inf": 1},
+                "sum": 4.05,
+                "count": 4,
+            },
+        }],
+        "open_devices": [{"labels": {}, "value": 2}],
+        "reports_total": [
+            {"labels": {"direction": "in"}, "value": 3},
+            {"labels": {"direction": "out"}, "value": 1},
+        ],
+    }
+
+
+def test_to_prometheus():
+    assert make_registry().to_prometheus() == (
+        "# HELP latency_seconds Latency\n"
+        "# TYPE latency_seconds histogram\n"
+        'latency_seconds_bucket{le="0.1"} 1\n'
+        'latency_seconds_bucket{le="1"} 3\n'
+        'latency_seconds_bucket{le="+Inf"} 4\n'
+        "latency_seconds_sum 4.05\n"
+        "latency_seconds_count 4\n"
+        "# HELP open_devices Open devices\n"
+        "# TYPE open_devices gauge\n"
+        "open_devices 2\n"
+        "# HELP reports_total Reports\n"
+        "# TYPE reports_total counter\n"
+        'reports_total{direction="in"} 3\n'
+        'reports_total{direction="out"} 1\n'
+    )
@@ -0,0 +1,193 @@
+import time
+import pytest
+
+pytest.importorskip("gi")
+
+from mv7config.microphone import max_write_attempts
+from mv7config.protocol import fetch_timeout
+from mv7config.simulator import SimulatedDevice
+
+
+class UnreliableDevice(SimulatedDevice):
+    """Simulated device ignoring some of the commands it receives."""
+    def __init__(self, ignore=(), ignore_once=(), **kwargs):
+        """
+        :param ignore: commands that are never answered
+        :param ignore_once: commands that are answered from the second time
+            they are received
+        :param kwargs: other arguments of :class:`SimulatedDevice`
+        """
+        super().__init__(**kwargs)
+        self.ignore = set(ignore)
+        self.ignore_once = set(ignore_once)
+
+    def _handle(self, command):
+        if command in self.ignore:
+            return
+
+        if command in self.ignore_once:
+            self.ignore_once.remove(command)
+            return
+
+        super()._handle(command)
+
+
+def test_initial_state(start_microphone):
+    microphone = start_microphone(SimulatedDevice())
+    assert microphone.props.serial_number == "MV7SIM000001"
+    assert microphone.props.monitor_volume == -1200
+    assert microphone.props.input_volume == 1800
+
+
+def test_handshake_timeout_fails(open_microphone, run_main_loop):
+    microphone = open_microphone(UnreliableDevice(ignore={"su adm"}))
+    failures = []
+    microphone.connect("failed", lambda _, message: failures.append(message))
+    microphone.initialize()
+    run_main_loop(lambda: failures)
+
+    assert failures == ["Device did not complete handshake phases: admin"]
+
+
+# Options of microphones starting from the saved state of a device
+cached = {"use_cache": True, "serial_number": "MV7SIM000001"}
+
+
+def test_saved_state_revalidated(
+    start_microphone, run_main_loop, monkeypatch, tmp_path,
+):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    saved = start_microphone(SimulatedDevice(), **cached)
+    saved.close()
+
+    device = SimulatedDevice()
+    device.values["volume"] = "-6.00dB"
+    device.mode_values["1"]["34"] = "00000005"
+    microphone = start_microphone(device, **cached)
+
+    # Wait for the last field to be revalidated
+    run_main_loop(lambda: microphone.props.auto_tone != saved.props.auto_tone)
+    microphone.close()
+
+    # Values that only change with the firmware are not asked again
+    assert microphone.props.monitor_volume == -600
+    assert "fwVersion" in device.received
+
+    for command in ("pkgVersion", "dspVersion", "serialNum"):
+        assert command not in device.received
+
+
+def test_saved_state_dropped_on_update(
+    start_microphone, run_main_loop, monkeypatch, tmp_path,
+):
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    saved = start_microphone(SimulatedDevice(), **cached)
+    saved.close()
+
+    device = SimulatedDevice()
+    device.values["fwVersion"] = "1.2.2"
+    device.values["dspVersion"] = "1.0.8"
+    microphone = start_microphone(device, **cached)
+    run_main_loop(lambda: microphone.props.dsp_version == "1.0.8")
+
+    assert microphone.props.firmware_version == "1.2.2"
+
+
+def test_query_retries_unanswered(start_microphone):
+    device = UnreliableDevice(ignore_once={"getBlock 19", "volume"})
+    microphone = start_microphone(device)
+
+    assert microphone.props.monitor_volume == -1200
+    assert device.received.count("getBlock 19") == 2
+    assert device.received.count("volume") == 2
+
+    # Answered queries are not sent again
+    for command in ("dspMode", "lock", "inputGain", "getBlock 22"):
+        assert device.received.count(command) == 1
+
+
+def test_close_interrupts_queries(open_microphone, run_main_loop):
+    device = UnreliableDevice(ignore={"getBlock 19"}, clock=time.monotonic)
+    microphone = open_microphone(device)
+    microphone.initialize()
+    run_main_loop(lambda: "getBlock 19" in device.received)
+
+    start = time.monotonic()
+    microphone.close()
+    assert time.monotonic() - start < fetch_timeout / 2
+
+
+def test_writes_are_coalesced(start_microphone, run_main_loop):
+    device = SimulatedDevice()
+    microphone = start_microphone(device)
+    device.received.clear()
+
+    for volume in range(-100, -2100, -100):
+        microphone.props.monitor_volume = volume
+
+    run_main_loop(lambda: device.values["volume"] == "-20.00dB")
+    sent = [
+        command for command in device.received
+        if command.startswith("volume")
+    ]
+    assert len(sent) < 20
+    assert sent[-1] == "volume -20.00"
+
+
+def test_batch_sends_shared_block_once(start_microphone, run_main_loop):
+    device = SimulatedDevice()
+    microphone = start_microphone(device)
+    device.received.clear()
+
+    with microphone.batch():
+        microphone.props.monitor_mix_mic = 0x1000C5
+        microphone.props.monitor_mix_pc = 0x2000C5
+
+    run_main_loop(lambda: device.values["22"] == "002000C5001000C5")
+    assert device.received == ["setBlock 22 002000C5001000C5"]
+
+
+def test_change_confirmed(start_microphone, run_main_loop):
+    device = SimulatedDevice()
+    microphone = start_microphone(device)
+    device.received.clear()
+    notified = []
+    microphone.connect("notify::input-mute", lambda *_: notified.append(True))
+
+    microphone.props.input_mute = True
+    run_main_loop(lambda: not microphone._intents)
+
+    assert device.received == ["micMute on"]
+    assert microphone.props.input_mute is True
+    assert notified == [True]
+
+
+def test_unconfirmed_change_resent(start_microphone, run_main_loop):
+    device = UnreliableDevice(ignore_once={"micMute on"})
+    microphone = start_microphone(device)
+    device.received.clear()
+
+    microphone.props.input_mute = True
+    run_main_loop(lambda: not microphone._intents)
+
+    assert device.received == ["micMute on", "micMute on"]
+    assert microphone.props.input_mute is True
+
+
+def test_unconfirmed_change_reverted(start_microphone, run_main_loop):
+    device = UnreliableDevice(ignore={"micMute on"})
+    microphone = start_microphone(device)
+    device.received.clear()
+    notified = []
+    microphone.connect(
+        "notify::input-mute",
+        lambda *_: notified.append(microphone.props.input_mute),
+    )
+
+    microphone.props.input_mute = True
+    assert microphone.props.input_mute is True
+    run_main_loop(lambda: len(notified) == 2)
+
+    assert device.received == ["micMute on"] * max_write_attempts
+    assert microphone.props.input_mute is False
+    assert notified == [True, False]
@@ -0,0 +1,69 @@
+import json
+import pytest
+from mv7config.cli import parse_value
+from mv7config.profile import load_profile, profile_from_state
+from mv7config.protocol import Mode, CompressorState, state_to_json
+
+
+def write_profile(tmp_path, data):
+    path = tmp_path / "profile.json"
+    path.write_text(json.dumps(data))
+    return path
+
+
+def test_load_profile(tmp_path):
+    path = write_profile(tmp_path, {
+        "mode": "Manual",
+        "compressor": "Heavy",
+        "input_volume": 2000,
+        "limiter": True,
+    })
+    assert load_profile(path) == {
+        "mode": Mode.Manual,
+        "compressor": CompressorState.Heavy,
+        "input_volume": 2000,
+        "limiter": True,
+    }
+
+
+@pytest.mark.parametrize("data", [
+    {"input_volume": "loud"},
+    {"input_volume": True},
+    {"input_volume": 20.5},
+    {"limiter": 1},
+    {"mode": "Loading"},
+    {"compressor": "Loud"},
+    {"compressor": [1]},
+    {"volume": 1},
+])
+def test_load_invalid_profile(tmp_path, data):
+    with pytest.raises(ValueError):
+        load_profile(write_profile(tmp_path, data))
+
+
+def test_load_full_dump(tmp_path):
+    state = {
+        "serial_number": "MV7SIM000001",
+        "firmware_version": "1.2.1",
+        "monitor_volume": -1200,
+        "mode": Mode.Auto,
+    }
+    path = write_profile(tmp_path, state_to_json(state))
+
+    # Read-only properties are ignored
+    assert load_profile(path) == profile_from_state(state)
+
+
+def test_parse_value():
+    assert parse_value("input_volume", "1800") == 1800
+    assert parse_value("limiter", "true") is True
+    assert parse_value("mode", "Auto") == Mode.Auto
+
+    for local_name, text in (
+        ("input_volume", "loud"),
+        ("input_volume", "true"),
+        ("limiter", "1"),
+        ("mode", "Loading"),
+    ):
+        with pytest.raises(ValueError):
+            parse_value(local_name, text)
@@ -0,0 +1,37 @@
+from mv7config.protocol import decode_message, Mode, DistanceState, ToneState
+
+
+def test_decode_assignment():
+    assert decode_message("volume=-12.00dB\n") == (
+        "volume", [("monitor_volume", -1200)],
+    )
+    assert decode_message("dspMode=2") == ("dspMode", [("mode", Mode.Auto)])
+
+
+def test_decode_shared_block():
+    # Both monitor mix levels are stored in block 22, one per half
+    assert decode_message("block 22 002026F3004026E7\n") == (
+        "22", [
+            ("monitor_mix_pc", 0x2026F3),
+            ("monitor_mix_mic", 0x4026E7),
+        ],
+    )
+    assert decode_message("block 34 00000005") == (
+        "34", [
+            ("auto_distance", DistanceState.Far),
+            ("auto_tone", ToneState.Dark),
+        ],
+    )
+
+
+def test_decode_invalid_block():
+    # Answered when a block does not exist in the current DSP mode
+    assert decode_message("block 19 Not valid\n") is None
+    assert decode_message("block 31 zz") is None
+
+
+def test_decode_unknown():
+    assert decode_message("su=adm") is None
+    assert decode_message("dspBooted") is None
+    assert decode_message("unknown=1") is None
+    assert decode_message("") is None
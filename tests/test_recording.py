@@ -0,0 +1,72 @@
+import pytest
+from mv7config.recording import (
+    Recorder,
+    Recording,
+    ReplayDevice,
+    report_in,
+    report_out,
+)
+from mv7config.simulator import SimulatedDevice, VirtualClock
+
+
+def test_recording_index(tmp_path):
+    path = tmp_path / "test.mv7rec"
+    clock = VirtualClock()
+    recorder = Recorder(path, clock)
+
+    for second in range(10):
+        clock.advance(1)
+        recorder.outgoing(f"query {second}".encode())
+        recorder.incoming(f"answer {second}".encode())
+
+    recorder.close()
+
+    # Interrupted recordings end with a partial record, which is ignored
+    with open(path, "ab") as file:
+        file.write(b"\1\2\3")
+
+    with Recording(path) as recording:
+        assert len(recording) == 20
+        assert recording.duration == 10
+        assert recording[0] == (1, report_out, b"query 0")
+        assert recording[19] == (10, report_in, b"answer 9")
+
+        assert recording.find(0) == 0
+        assert recording.find(5) == 8
+        assert recording.find(5.5) == 10
+        assert recording.find(11) == 20
+
+        with pytest.raises(IndexError):
+            recording[20]
+
+
+def test_not_a_recording(tmp_path):
+    path = tmp_path / "test.mv7rec"
+    path.write_bytes(b"not a recording file")
+
+    with pytest.raises(ValueError):
+        Recording(path)
+
+
+def test_record_and_replay(tmp_path):
+    path = tmp_path / "test.mv7rec"
+    device = SimulatedDevice()
+    device.start_recording(path)
+    device.send_command("volume")
+    device.send_command("getBlock 22")
+    answers = [device.read_message(-1), device.read_message(-1)]
+    device.close()
+
+    assert answers == ["volume=-12.00dB\n", "block 22 002026F3004026E7\n"]
+
+    with Recording(path) as recording:
+        replay = ReplayDevice(recording, start=0, clock=VirtualClock())
+        replay.send_command("lock")
+
+        assert [replay.read_message(-1), replay.read_message(-1)] == answers
+
+        # Answers are replayed at the pace at which they were received
+        assert replay.clock() == pytest.approx(recording.duration)
+        assert replay.read_message(0) is None
+        assert replay.received == ["lock"]
+        replay.close()
@@ -0,0 +1,81 @@
+import pytest
+from mv7config import sysfs
+from mv7config.protocol import shure_vendor_id, mv7_product_id
+
+
+@pytest.fixture
+def sysfs_root(tmp_path, monkeypatch):
+    """Empty sysfs tree in which hidraw devices can be added."""
+    monkeypatch.setattr(sysfs, "sysfs_root", str(tmp_path))
+    monkeypatch.setattr(sysfs, "_enumeration_cache", (None, None))
+    (tmp_path / "class" / "hidraw").mkdir(parents=True)
+    return tmp_path
+
+
+def add_hidraw(root, name, vendor_id, product_id, interface, serial=""):
+    """Add a hidraw device to a sysfs tree."""
+    device = root / "class" / "hidraw" / name / "device"
+    device.mkdir(parents=True)
+    (device / "uevent").write_text(
+        "DRIVER=hid-generic\n"
+        f"HID_ID=0003:{vendor_id:08X}:{product_id:08X}\n"
+        "HID_NAME=Shure Inc Shure MV7\n"
+        f"HID_PHYS=usb-0000:00:14.0-1/input{interface}\n"
+        f"HID_UNIQ={serial}\n"
+    )
+
+
+def enumerate_mv7():
+    return sysfs.enumerate_hidraw(shure_vendor_id, mv7_product_id, 3)
+
+
+def test_enumerate(sysfs_root):
+    add_hidraw(sysfs_root, "hidraw0", shure_vendor_id, mv7_product_id, 0)
+    add_hidraw(
+        sysfs_root, "hidraw1", shure_vendor_id, mv7_product_id, 3, "MV7A",
+    )
+    add_hidraw(sysfs_root, "hidraw2", 0x046D, mv7_product_id, 3)
+
+    assert enumerate_mv7() == {
+        b"/dev/hidraw1": {
+            "path": b"/dev/hidraw1",
+            "vendor_id": shure_vendor_id,
+            "product_id": mv7_product_id,
+            "interface_number": 3,
+            "serial_number": "MV7A",
+            "product_string": "Shure Inc Shure MV7",
+            "bus_type": 3,
+        },
+    }
+
+    class_dir = sysfs_root / "class" / "hidraw"
+    assert sysfs.microphone_info(class_dir / "hidraw0") is None
+    assert sysfs.microphone_info(class_dir / "hidraw1")["serial_number"] == (
+        "MV7A"
+    )
+
+
+def test_enumerate_after_change(sysfs_root):
+    add_hidraw(
+        sysfs_root, "hidraw0", shure_vendor_id, mv7_product_id, 3, "MV7A",
+    )
+    assert list(enumerate_mv7()) == [b"/dev/hidraw0"]
+
+    add_hidraw(
+        sysfs_root, "hidraw1", shure_vendor_id, mv7_product_id, 3, "MV7B",
+    )
+    assert sorted(enumerate_mv7()) == [b"/dev/hidraw0", b"/dev/hidraw1"]
+
+
+def test_invalid_device(sysfs_root):
+    device = sysfs_root / "class" / "hidraw" / "hidraw0" / "device"
+    device.mkdir(parents=True)
+    (device / "uevent").write_text("DRIVER=hid-generic\n")
+
+    assert sysfs.hid_device_info(device.parent) is None
+    assert enumerate_mv7() == {}
+
+
+def test_no_hidraw(tmp_path, monkeypatch):
+    monkeypatch.setattr(sysfs, "sysfs_root", str(tmp_path))
+    assert enumerate_mv7() is None
@@ -0,0 +1,96 @@
+import queue
+import threading
+import time
+from mv7config import text_hid
+from mv7config.text_hid import TextHID, report_size
+
+
+class LoopbackHID(TextHID):
+    """Device keeping the reports written to it and answering given ones."""
+    def _open(self):
+        self.written = []
+        self.pending = []
+
+    def _close(self):
+        pass
+
+    def _write_raw(self, report):
+        self.written.append(bytes(report))
+
+    def _read_raw(self, timeout_ms):
+        return self.pending.pop(0) if self.pending else None
+
+
+def test_command_padded():
+    device = LoopbackHID(b"loopback")
+    device.send_command("setBlock 22 002026F3004026E7")
+    device.send_command("lock on")
+
+    # Reports are reused but do not keep bytes from longer commands
+    assert device.written == [
+        b"setBlock 22 002026F3004026E7".ljust(report_size, b"\0"),
+        b"lock on".ljust(report_size, b"\0"),
+    ]
+
+
+def test_command_truncated():
+    device = LoopbackHID(b"loopback")
+    device.send_command("setBlock " + "0" * report_size)
+    device.write_report(b"a" * 40, b"b" * 40)
+
+    assert device.written == [
+        (b"setBlock " + b"0" * report_size)[:report_size],
+        b"a" * 40 + b"b" * (report_size - 40),
+    ]
+
+
+def test_message_cut_at_zero():
+    device = LoopbackHID(b"loopback")
+    device.pending = [
+        b"volume=-12.00dB\n".ljust(report_size, b"\0"),
+        b"x" * report_size,
+    ]
+
+    assert device.read_message() == "volume=-12.00dB\n"
+    assert device.read_report() == b"x" * report_size
+    assert device.read_message() is None
+
+
+class FakeHidapiDevice:
+    """Stand-in for a hidapi device, whose reads cannot be interrupted."""
+    def __init__(self):
+        self.incoming = queue.SimpleQueue()
+        self.closed = False
+
+    def open_path(self, path):
+        pass
+
+    def set_nonblocking(self, nonblocking):
+        pass
+
+    def read(self, max_length, timeout_ms):
+        try:
+            return list(self.incoming.get(timeout=timeout_ms / 1000))
+        except queue.Empty:
+            return []
+
+    def close(self):
+        self.closed = True
+
+
+def test_hidapi_read_woken(monkeypatch):
+    hid_device = FakeHidapiDevice()
+    monkeypatch.setattr(text_hid.hid, "device", lambda: hid_device)
+    device = TextHID(b"fake")
+
+    threading.Timer(.05, device.wakeup).start()
+    start = time.monotonic()
+    assert device.read_message(-1) is None
+    assert time.monotonic() - start < text_hid.hidapi_wakeup_interval / 1000
+
+    hid_device.incoming.put(b"volume=-12.00dB\n".ljust(report_size, b"\0"))
+    assert device.read_message(1000) == "volume=-12.00dB\n"
+    assert device.read_message(0) is None
+
+    device.close()
+    assert hid_device.closed
@@ -0,0 +1,57 @@
+import pytest
+
+pytest.importorskip("gi")
+
+from mv7config.utils import ThrottleScheduler
+
+
+def test_callbacks_run_in_order(run_main_loop):
+    scheduler = ThrottleScheduler()
+    start = scheduler.clock()
+    ran = []
+
+    def record(name):
+        return lambda: ran.append((name, scheduler.clock() - start))
+
+    scheduler.schedule("late", start + .2, record("late"))
+
+    # Earlier deadlines move the shared timer, those on the same tick share it
+    scheduler.schedule("first", start + .01, record("first"))
+    scheduler.schedule("second", start + .01, record("second"))
+    assert len(scheduler) == 3
+
+    run_main_loop(lambda: len(ran) == 3)
+    assert [name for name, _ in ran] == ["first", "second", "late"]
+    assert ran[0][1] < .2 <= ran[2][1]
+    assert len(scheduler) == 0
+
+
+def test_replace_and_cancel(run_main_loop):
+    scheduler = ThrottleScheduler()
+    start = scheduler.clock()
+    ran = []
+
+    scheduler.schedule("a", start + .01, lambda: ran.append("a1"))
+    scheduler.schedule("a", start + .02, lambda: ran.append("a2"))
+    scheduler.schedule("b", start + .01, lambda: ran.append("b"))
+    scheduler.cancel("b")
+    scheduler.cancel("unknown")
+    assert len(scheduler) == 1
+
+    run_main_loop(lambda: ran)
+    assert ran == ["a2"]
+
+
+def test_reschedule_from_callback(run_main_loop):
+    scheduler = ThrottleScheduler()
+    ran = []
+
+    def callback():
+        ran.append(scheduler.clock())
+
+        if len(ran) < 3:
+            scheduler.schedule("a", scheduler.clock() + .01, callback)
+
+    scheduler.schedule("a", scheduler.clock() + .01, callback)
+    run_main_loop(lambda: len(ran) == 3)
+    assert len(scheduler) == 0
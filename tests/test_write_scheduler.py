@@ -0,0 +1,90 @@
+from mv7config.simulator import VirtualClock
+from mv7config.write_scheduler import WriteScheduler, Priority
+
+
+def test_burst_is_coalesced():
+    clock = VirtualClock()
+    writer = WriteScheduler(max_rate=20, clock=clock)
+
+    for volume in range(10):
+        writer.write("volume", f"volume -{volume}.00")
+
+    # The first command of a burst is sent immediately
+    commands, next_due = writer.pop_due()
+    assert commands == [(Priority.User, "volume", "volume -9.00")]
+    assert next_due is None
+
+    for volume in range(10, 20):
+        writer.write("volume", f"volume -{volume}.00")
+
+    # Commands queued during the interval collapse to the newest one
+    commands, next_due = writer.pop_due()
+    assert commands == []
+    assert next_due == 1 / 20
+
+    clock.advance(next_due)
+    commands, next_due = writer.pop_due()
+    assert commands == [(Priority.User, "volume", "volume -19.00")]
+    assert next_due is None
+
+
+def test_keys_are_independent():
+    clock = VirtualClock()
+    writer = WriteScheduler(max_rate=20, clock=clock)
+    writer.write("volume", "volume -1.00")
+    writer.write("micMute", "micMute on")
+    writer.write("volume", "volume -2.00")
+
+    commands, _ = writer.pop_due()
+    assert [command for _, _, command in commands] == [
+        "volume -2.00",
+        "micMute on",
+    ]
+
+
+def test_user_commands_first():
+    clock = VirtualClock()
+    writer = WriteScheduler(clock=clock, max_total_rate=10, max_burst=2)
+
+    for block in range(5):
+        writer.write(f"getBlock {block}", f"getBlock {block}", Priority.Sync)
+
+    writer.write("micMute", "micMute on")
+    commands, next_due = writer.pop_due()
+    assert [command for _, _, command in commands] == [
+        "micMute on",
+        "getBlock 0",
+    ]
+    assert next_due == 1 / 10
+
+    # Classes that are not asked for are kept queued
+    clock.advance(next_due)
+    writer.write("volume", "volume -1.00")
+    commands, _ = writer.pop_due((Priority.Sync,))
+    assert [command for _, _, command in commands] == ["getBlock 1"]
+    assert writer.depth()[Priority.User] == 1
+
+
+def test_diagnostics_last():
+    writer = WriteScheduler(clock=VirtualClock(), max_total_rate=10)
+    writer.write("fwVersion", "fwVersion", Priority.Diagnostics)
+    writer.write("getBlock 22", "getBlock 22", Priority.Sync)
+    writer.write("volume", "volume -1.00")
+    commands, _ = writer.pop_due()
+
+    assert [priority for priority, _, _ in commands] == [
+        Priority.User,
+        Priority.Sync,
+        Priority.Diagnostics,
+    ]
+
+
+def test_drain_ignores_limits():
+    writer = WriteScheduler(max_rate=20, clock=VirtualClock(), max_burst=1)
+    writer.write("volume", "volume -1.00")
+    writer.pop_due()
+    writer.write("volume", "volume -2.00")
+    writer.write("micMute", "micMute on")
+
+    assert writer.drain() == ["volume -2.00", "micMute on"]
+    assert len(writer) == 0